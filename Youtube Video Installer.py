@@ -1,22 +1,51 @@
 import os
 import sys
 import subprocess
-import ctypes
-import urllib.request
 import shutil
 import zipfile
-import winreg as reg
 import re
 import tempfile
-import ssl
+import argparse
+import contextlib
+import functools
+import hashlib
+import itertools
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def get_tool_signature(name):
+    """Return the resolved path and modification time of an executable on PATH, or None if it is missing."""
+    path = shutil.which(name)
+    if not path:
+        return None
+    return [os.path.realpath(path), os.path.getmtime(path)]
+
+def tool_probe_cached(name):
+    """Check whether a successful probe of the tool is recorded for its current binary."""
+    signature = get_tool_signature(name)
+    return signature is not None and load_json_cache('toolchain.json').get(name) == signature
+
+def record_tool_probe(name):
+    state = load_json_cache('toolchain.json')
+    state[name] = get_tool_signature(name)
+    save_json_cache('toolchain.json', state)
 
 def is_ffmpeg_installed():
-    """Check if ffmpeg is installed by trying to run 'ffmpeg -version'."""
+    """Check if ffmpeg is installed by trying to run 'ffmpeg -version'.
+
+    A successful check is remembered until the ffmpeg binary's path or mtime changes.
+    """
+    if tool_probe_cached('ffmpeg'):
+        return True
     try:
         subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
     except FileNotFoundError:
         return False
+    record_tool_probe('ffmpeg')
+    return True
 
 def prompt_install_ffmpeg():
     """Prompt the user to install ffmpeg."""
@@ -25,6 +54,7 @@ def prompt_install_ffmpeg():
 
 def is_admin():
     """Check if the script is running with administrator privileges."""
+    import ctypes
     try:
         return ctypes.windll.shell32.IsUserAnAdmin()
     except:
@@ -32,6 +62,7 @@ def is_admin():
 
 def run_as_admin():
     """Re-launch the script with administrator privileges."""
+    import ctypes
     # Build the command line
     cmd = [sys.executable] + sys.argv
     params = ' '.join(f'"{x}"' for x in cmd[1:])
@@ -39,11 +70,132 @@ def run_as_admin():
     ctypes.windll.shell32.ShellExecuteW(None, "runas", cmd[0], params, None, 1)
     sys.exit()
 
+# Files smaller than this are always fetched over a single connection
+MIN_SPLIT_SIZE = 8 * 1024 * 1024
+
+def probe_download(url, context):
+    """Ask the server for the first byte of a file to learn its final URL, size and Range support."""
+    import urllib.request
+    request = urllib.request.Request(url, headers={'Range': 'bytes=0-0'})
+    with urllib.request.urlopen(request, context=context) as response:
+        final_url = response.geturl()
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified') or ''
+        content_range = response.headers.get('Content-Range', '')
+        if response.status == 206 and '/' in content_range and not content_range.endswith('/*'):
+            return final_url, int(content_range.rsplit('/', 1)[1]), True, validator
+        length = response.headers.get('Content-Length')
+        return final_url, int(length) if length else None, False, validator
+
+def load_download_state(state_path, url, size, validator):
+    """Load the sidecar state of a partial download if it belongs to the same remote file."""
+    try:
+        with open(state_path, encoding='utf-8') as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return None
+    if state.get('url') != url or state.get('size') != size or state.get('validator') != validator:
+        return None
+    return state
+
+def save_download_state(state_path, state):
+    temp_path = state_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, state_path)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download_file(url, output_path, connections=4, sha256=None):
+    """Download a file using several parallel HTTP Range requests.
+
+    Progress is kept in a '<output_path>.state' sidecar file so an interrupted download
+    resumes where it stopped. Servers without Range support get a single stream. The size
+    (and the SHA-256 checksum, when given) is verified at the end.
+    """
+    import ssl
+    import urllib.request
+    context = ssl._create_unverified_context()
+    final_url, size, supports_ranges, validator = probe_download(url, context)
+    state_path = output_path + '.state'
+
+    if not supports_ranges or size is None or size < MIN_SPLIT_SIZE or connections < 2:
+        with urllib.request.urlopen(final_url, context=context) as response, open(output_path, 'wb') as out_file:
+            shutil.copyfileobj(response, out_file)
+    else:
+        state = load_download_state(state_path, url, size, validator) if os.path.exists(output_path) else None
+        if state is None:
+            part_size = -(-size // connections)
+            parts = [[start, min(start + part_size, size) - 1, 0] for start in range(0, size, part_size)]
+            state = {'url': url, 'size': size, 'validator': validator, 'parts': parts}
+            with open(output_path, 'wb') as out_file:
+                out_file.truncate(size)
+            save_download_state(state_path, state)
+        else:
+            done = sum(part[2] for part in state['parts'])
+            print(f"Resuming download at {done * 100 // size}%...")
+        lock = threading.Lock()
+        last_save = [time.monotonic()]
+
+        def fetch_part(part):
+            start, end, done = part
+            if start + done > end:
+                return
+            request = urllib.request.Request(final_url, headers={'Range': f'bytes={start + done}-{end}'})
+            with urllib.request.urlopen(request, context=context) as response, open(output_path, 'r+b') as out_file:
+                if response.status != 206:
+                    raise IOError(f"Server ignored the Range request for bytes {start + done}-{end}")
+                out_file.seek(start + done)
+                while True:
+                    block = response.read(256 * 1024)
+                    if not block:
+                        break
+                    out_file.write(block)
+                    with lock:
+                        part[2] += len(block)
+                        if time.monotonic() - last_save[0] > 1:
+                            save_download_state(state_path, state)
+                            last_save[0] = time.monotonic()
+
+        try:
+            with ThreadPoolExecutor(max_workers=connections) as pool:
+                list(pool.map(fetch_part, state['parts']))
+        finally:
+            save_download_state(state_path, state)
+        if any(start + done <= end for start, end, done in state['parts']):
+            raise IOError("Download ended before all parts were received.")
+
+    if size is not None and os.path.getsize(output_path) != size:
+        raise IOError(f"Downloaded {os.path.getsize(output_path)} bytes, expected {size}.")
+    if sha256 and file_sha256(output_path) != sha256.lower():
+        os.remove(output_path)
+        raise IOError("Checksum mismatch, the download is corrupt.")
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+def get_ffmpeg_checksum(url):
+    """Look up the published SHA-256 of a BtbN ffmpeg build, or None if it is unavailable."""
+    import ssl
+    import urllib.request
+    checksums_url = url.rsplit('/', 1)[0] + '/checksums.sha256'
+    file_name = url.rsplit('/', 1)[1]
+    try:
+        with urllib.request.urlopen(checksums_url, context=ssl._create_unverified_context()) as response:
+            for line in response.read().decode('utf-8').splitlines():
+                fields = line.split()
+                if len(fields) == 2 and fields[1].lstrip('*') == file_name:
+                    return fields[0]
+    except (OSError, ValueError):
+        pass
+    return None
+
 def download_ffmpeg(url, output_path):
     """Download the ffmpeg .zip file from the given URL."""
-    context = ssl._create_unverified_context()
-    with urllib.request.urlopen(url, context=context) as response, open(output_path, 'wb') as out_file:
-        shutil.copyfileobj(response, out_file)
+    download_file(url, output_path, sha256=get_ffmpeg_checksum(url))
 
 def extract_zip(zip_path, extract_to):
     """Extract the downloaded zip file to the specified directory."""
@@ -64,8 +216,83 @@ def install_ffmpeg(extract_path, install_path):
         shutil.rmtree(install_path)
     shutil.move(extracted_folder, install_path)
 
+# Parts of the ffmpeg build that are actually installed; the documentation is skipped
+FFMPEG_INSTALL_MEMBERS = ('bin/', 'LICENSE')
+
+def install_ffmpeg_from_zip(zip_path, install_path, members=FFMPEG_INSTALL_MEMBERS):
+    """Install ffmpeg straight from the downloaded zip.
+
+    Only the members whose path (inside the top-level ffmpeg folder) starts with one of
+    members are extracted, into a staging folder next to install_path that is then swapped
+    in with renames, so nothing is extracted twice or moved across volumes.
+    """
+    install_path = os.path.abspath(install_path)
+    staging_path = install_path + '.staging'
+    old_path = install_path + '.old'
+    for leftover in (staging_path, old_path):
+        if os.path.exists(leftover):
+            shutil.rmtree(leftover)
+
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        extracted = 0
+        for member in zip_ref.infolist():
+            top_folder, _, relative_path = member.filename.partition('/')
+            if member.is_dir() or not top_folder.lower().startswith('ffmpeg') or not relative_path.startswith(members):
+                continue
+            target_path = os.path.normpath(os.path.join(staging_path, relative_path))
+            if not target_path.startswith(staging_path + os.sep):
+                raise ValueError(f"Unsafe path in ffmpeg archive: {member.filename}")
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with zip_ref.open(member) as source, open(target_path, 'wb') as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            extracted += 1
+    if not extracted:
+        raise FileNotFoundError("No ffmpeg files found in the archive.")
+
+    if os.path.exists(install_path):
+        os.rename(install_path, old_path)
+    os.rename(staging_path, install_path)
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path, ignore_errors=True)
+
+def benchmark_ffmpeg_install(work_folder=None, binary_size=64 * 1024 * 1024, doc_files=400):
+    """Time extract_zip + install_ffmpeg against install_ffmpeg_from_zip on a locally generated zip.
+
+    The zip mimics the layout of the BtbN builds: large binaries in bin/ and many small
+    documentation files next to them.
+    """
+    work_folder = work_folder or tempfile.mkdtemp(prefix='ffmpeg-install-bench-')
+    zip_path = os.path.join(work_folder, 'ffmpeg-bench.zip')
+    top_folder = 'ffmpeg-master-latest-win64-gpl'
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zip_ref:
+        for name in ('ffmpeg.exe', 'ffprobe.exe', 'ffplay.exe'):
+            zip_ref.writestr(f'{top_folder}/bin/{name}', os.urandom(binary_size))
+        for index in range(doc_files):
+            zip_ref.writestr(f'{top_folder}/doc/page{index}.html', '<p>documentation</p>' * 200)
+        zip_ref.writestr(f'{top_folder}/LICENSE.txt', 'GPL')
+
+    try:
+        started = time.perf_counter()
+        extract_path = os.path.join(work_folder, 'ffmpeg_temp')
+        extract_zip(zip_path, extract_path)
+        install_ffmpeg(extract_path, os.path.join(work_folder, 'install_full'))
+        shutil.rmtree(extract_path)
+        full_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        install_ffmpeg_from_zip(zip_path, os.path.join(work_folder, 'install_streamed'))
+        streamed_time = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    print(f"extractall + move: {full_time:.2f}s")
+    print(f"selective extract + swap: {streamed_time:.2f}s ({full_time / max(streamed_time, 1e-6):.1f}x faster)")
+    return full_time, streamed_time
+
 def add_ffmpeg_to_path(ffmpeg_bin_path):
     """Add the ffmpeg bin directory to the system PATH environment variable."""
+    import ctypes
+    import winreg as reg
     # Open the registry key
     reg_key = reg.OpenKey(
         reg.HKEY_CURRENT_USER,
@@ -121,18 +348,10 @@ def check_ffmpeg():
         print(f"Error downloading ffmpeg: {e}")
         return
 
-    print("Extracting ffmpeg...")
-    extract_path = os.path.join(user_home, 'ffmpeg_temp')
-    try:
-        extract_zip(output_path, extract_path)
-    except Exception as e:
-        print(f"Error extracting ffmpeg: {e}")
-        return
-
     print("Installing ffmpeg...")
     install_path = r'C:\ffmpeg'
     try:
-        install_ffmpeg(extract_path, install_path)
+        install_ffmpeg_from_zip(output_path, install_path)
     except Exception as e:
         print(f"Error installing ffmpeg: {e}")
         return
@@ -148,7 +367,6 @@ def check_ffmpeg():
     print("Cleaning up temporary files...")
     try:
         os.remove(output_path)
-        shutil.rmtree(extract_path)
     except Exception as e:
         print(f"Error cleaning up temporary files: {e}")
         return
@@ -167,45 +385,123 @@ def parse_time(time_str):
     else:
         raise ValueError("Invalid time format. Use hh:mm:ss, mm:ss, or ss.")
 
+def time_to_seconds(time_str):
+    """Convert a 'hh:mm:ss', 'mm:ss' or 'ss' string into a number of seconds.
+
+    The seconds may have a fractional part, which makes the result a float.
+    """
+    seconds = 0
+    for part in time_str.strip().split(':'):
+        seconds = seconds * 60 + (float(part) if '.' in part else int(part))
+    return seconds
+
+def make_time_range(start, end):
+    """Build the '*start-end' time range, in seconds, that jobs and sources carry."""
+    return f'*{round(start, 3)}-{round(end, 3)}'
+
+def get_range_seconds(time_range):
+    """Return the (start, end) seconds of a '*start-end' time range."""
+    start_time, end_time = time_range.lstrip('*').split('-')
+    return time_to_seconds(start_time), time_to_seconds(end_time)
+
 def check_python_installed():
     python_path = shutil.which('python')
     return python_path is not None
 
 
+PYTHON_DOWNLOAD_HOST = 'www.python.org'
+PYTHON_DOWNLOAD_PATH = '/ftp/python/'
+
+# How long a resolved Python installer URL is trusted before python.org is asked again
+PYTHON_RELEASE_TTL = 24 * 60 * 60
+
+# Number of installer candidates checked at once, each over its own kept-alive connection
+PYTHON_PROBE_WORKERS = 8
+
+def python_org_request(local, connections, method, path):
+    """Send a request over this thread's persistent python.org connection, reconnecting once if it dropped.
+
+    New connections are added to the connections list so the caller can close them all.
+    """
+    import http.client
+    import ssl
+    for attempt in range(2):
+        if getattr(local, 'connection', None) is None:
+            local.connection = http.client.HTTPSConnection(
+                PYTHON_DOWNLOAD_HOST, context=ssl._create_unverified_context(), timeout=15)
+            connections.append(local.connection)
+        try:
+            local.connection.request(method, path)
+            response = local.connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            local.connection.close()
+            local.connection = None
+            if attempt:
+                raise
+
+def find_latest_python_installer():
+    """Return the newest stable Python version that has a Windows amd64 installer, or None."""
+    local = threading.local()
+    connections = []
+    try:
+        status, body = python_org_request(local, connections, 'GET', PYTHON_DOWNLOAD_PATH)
+        if status != 200:
+            raise OSError(f"python.org answered {status}")
+        html = body.decode('utf-8')
+
+        # Extract all directory names
+        versions = re.findall(r'href="([0-9\.]+)/"', html)
+        # Filter out pre-release versions (those that contain letters)
+        stable_versions = [v for v in versions if re.fullmatch(r'\d+\.\d+\.\d+', v)]
+        # Sort versions in reverse order (latest first)
+        stable_versions.sort(key=lambda s: list(map(int, s.split('.'))), reverse=True)
+
+        def installer_exists(version):
+            status, _ = python_org_request(local, connections, 'HEAD', f'{PYTHON_DOWNLOAD_PATH}{version}/python-{version}-amd64.exe')
+            return status == 200
+
+        # Check the candidates in batches, newest first, keeping the first hit in version order
+        with ThreadPoolExecutor(max_workers=PYTHON_PROBE_WORKERS) as pool:
+            for index in range(0, len(stable_versions), PYTHON_PROBE_WORKERS):
+                batch = stable_versions[index:index + PYTHON_PROBE_WORKERS]
+                for version, exists in zip(batch, pool.map(installer_exists, batch)):
+                    if exists:
+                        return version
+        return None
+    finally:
+        for connection in connections:
+            connection.close()
+
 def get_latest_python_download_url():
+    import http.client
+    cache = load_json_cache('python_release.json')
+    if cache.get('url') and time.time() - cache.get('checked', 0) < PYTHON_RELEASE_TTL:
+        print(f"Latest stable Python version is {cache['version']} (cached)")
+        return cache['url']
+
     print("Retrieving the latest stable Python version...")
-    base_url = 'https://www.python.org/ftp/python/'
-    context = ssl._create_unverified_context()
-    with urllib.request.urlopen(base_url, context=context) as response:
-        html = response.read().decode('utf-8')
-
-    # Extract all directory names
-    versions = re.findall(r'href="([0-9\.]+)/"', html)
-    # Filter out pre-release versions (those that contain letters)
-    stable_versions = [v for v in versions if re.fullmatch(r'\d+\.\d+\.\d+', v)]
-    # Sort versions in reverse order (latest first)
-    stable_versions.sort(key=lambda s: list(map(int, s.split('.'))), reverse=True)
-
-    # Check if installer exists for each version
-    for version in stable_versions:
-        installer_url = f'{base_url}{version}/python-{version}-amd64.exe'
-        try:
-            req = urllib.request.Request(installer_url, method='HEAD')
-            with urllib.request.urlopen(req, context=context) as resp:
-                if resp.status == 200:
-                    print(f"Latest stable Python version is {version}")
-                    return installer_url
-        except urllib.error.HTTPError:
-            continue  # Installer does not exist for this version
+    try:
+        version = find_latest_python_installer()
+    except (http.client.HTTPException, OSError) as e:
+        if cache.get('url'):
+            print(f"Could not reach python.org ({e}), using the last known Python {cache['version']}.")
+            return cache['url']
+        print(f"Could not reach python.org: {e}")
+        sys.exit(1)
+
+    if version is None:
+        print("Could not find a suitable Python installer.")
+        sys.exit(1)
 
-    print("Could not find a suitable Python installer.")
-    sys.exit(1)
+    installer_url = f'https://{PYTHON_DOWNLOAD_HOST}{PYTHON_DOWNLOAD_PATH}{version}/python-{version}-amd64.exe'
+    save_json_cache('python_release.json', {'version': version, 'url': installer_url, 'checked': time.time()})
+    print(f"Latest stable Python version is {version}")
+    return installer_url
 
 def download_python_installer(download_url, save_path):
     print("Downloading Python installer...")
-    context = ssl._create_unverified_context()
-    with urllib.request.urlopen(download_url, context=context) as response, open(save_path, 'wb') as out_file:
-        shutil.copyfileobj(response, out_file)
+    download_file(download_url, save_path)
 
 def install_python(installer_path):
     print("Installing Python...")
@@ -231,6 +527,7 @@ def check_python():
             if not is_admin():
                 print("Requesting administrative privileges...")
                 # Re-run the program with admin rights
+                import ctypes
                 ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, ' '.join(sys.argv), None, 1)
                 sys.exit()
             else:
@@ -248,185 +545,1920 @@ def check_python():
 
     # Continue with the rest of your script (if Python was already installed)
     # Example: using pip to install packages
-    try:
-        subprocess.check_call(['pip', '--version'])
-    except FileNotFoundError:
-        print("pip not found. Installing pip...")
-        subprocess.check_call([sys.executable, '-m', 'ensurepip', '--upgrade'])
+    if not tool_probe_cached('pip'):
+        try:
+            subprocess.check_call(['pip', '--version'])
+            record_tool_probe('pip')
+        except FileNotFoundError:
+            print("pip not found. Installing pip...")
+            subprocess.check_call([sys.executable, '-m', 'ensurepip', '--upgrade'])
 
     # Your main application logic here
     print("Your script is now running with Python installed.")
 
-def download_video(url, destination_folder, time_range, download_thumbnail, force8K, force4K, force2K, lowPerformance):
-    ydl_opts = {
+# Video encoders in order of preference; hardware encoders first, then software fallbacks
+ENCODER_PREFERENCE = ['hevc_nvenc', 'hevc_qsv', 'hevc_vaapi', 'libx265', 'libx264', 'libsvtav1']
+
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# Equivalent settings for the two quality profiles on every supported encoder.
+# 'high' is the p7/cq18 NVENC profile, 'lowPerformance' the p5/cq22 one.
+ENCODER_PROFILES = {
+    'hevc_nvenc': {
+        'high': [
+            '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
+            '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
+            '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
+            '-profile:v', 'main10',
+            '-rc-lookahead', '32',  # Enhance future frame prediction
+            '-spatial-aq', '1',  # Adaptive quantization to preserve details
+            '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
+        ],
+        'lowPerformance': ['-preset', 'p5', '-cq', '22', '-profile:v', 'main'],
+    },
+    'hevc_qsv': {
+        'high': ['-preset', 'veryslow', '-global_quality', '18'],
+        'lowPerformance': ['-preset', 'medium', '-global_quality', '22'],
+    },
+    'hevc_vaapi': {
+        'high': ['-rc_mode', 'CQP', '-qp', '18', '-profile:v', 'main'],
+        'lowPerformance': ['-rc_mode', 'CQP', '-qp', '22', '-profile:v', 'main'],
+    },
+    'libx265': {
+        'high': ['-preset', 'slow', '-crf', '18', '-pix_fmt', 'yuv444p'],
+        'lowPerformance': ['-preset', 'fast', '-crf', '22', '-pix_fmt', 'yuv420p'],
+    },
+    'libx264': {
+        'high': ['-preset', 'slow', '-crf', '18', '-pix_fmt', 'yuv444p'],
+        'lowPerformance': ['-preset', 'fast', '-crf', '22', '-pix_fmt', 'yuv420p'],
+    },
+    'libsvtav1': {
+        'high': ['-preset', '4', '-crf', '24', '-pix_fmt', 'yuv420p10le'],
+        'lowPerformance': ['-preset', '8', '-crf', '30', '-pix_fmt', 'yuv420p'],
+    },
+}
+
+SHARPEN_FILTER = 'unsharp=5:5:0.8:3:3:0.4'
+
+def get_cache_dir():
+    """Return the folder used for the tool's persistent caches, creating it if needed."""
+    cache_dir = os.path.join(os.path.expanduser('~'), '.youtube_video_installer')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+def load_json_cache(name):
+    try:
+        with open(os.path.join(get_cache_dir(), name), encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_json_cache(name, data):
+    """Atomically write a JSON cache file so concurrent runs never see a partial file."""
+    cache_dir = get_cache_dir()
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as cache_file:
+        json.dump(data, cache_file)
+    os.replace(temp_path, os.path.join(cache_dir, name))
+
+def get_encoder_input_args(encoder):
+    """Return the ffmpeg options that have to come before the input for the given encoder."""
+    if encoder == 'hevc_vaapi':
+        return ['-vaapi_device', VAAPI_DEVICE]
+    return []
+
+def encoder_works(encoder):
+    """Encode a few test frames with each of the encoder's profiles to check that it is usable on this machine.
+
+    The profile arguments are planned as for a typical 8-bit 4:2:0 source (see plan_video_filters).
+    """
+    filter_args = ['-vf', 'format=nv12,hwupload'] if encoder == 'hevc_vaapi' else []
+    for profile_args in ENCODER_PROFILES[encoder].values():
+        video_args = plan_video_filters({'pix_fmt': 'yuv420p'}, None, encoder, profile_args, [])[1]
+        command = (['ffmpeg', '-hide_banner', '-loglevel', 'error'] + get_encoder_input_args(encoder) +
+                   ['-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.2'] + filter_args +
+                   ['-c:v', encoder] + video_args + ['-frames:v', '3', '-f', 'null', '-'])
+        try:
+            if subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=30).returncode != 0:
+                return False
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+    return True
+
+@functools.lru_cache(maxsize=None)
+def probe_encoders():
+    """Return the usable video encoders, best first.
+
+    The result is cached on disk, keyed on the ffmpeg binary's path and modification time
+    and on ENCODER_PROFILES.
+    """
+    ffmpeg_path = shutil.which('ffmpeg')
+    if not ffmpeg_path:
+        return []
+    profiles_hash = hashlib.sha256(json.dumps(ENCODER_PROFILES, sort_keys=True).encode()).hexdigest()[:16]
+    cache_key = f'{os.path.realpath(ffmpeg_path)}:{os.path.getmtime(ffmpeg_path)}:{profiles_hash}'
+    cache = load_json_cache('encoders.json')
+    if cache.get('key') == cache_key:
+        return cache['encoders']
+
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    listed = {line.split()[1] for line in result.stdout.splitlines() if len(line.split()) > 1}
+    encoders = [encoder for encoder in ENCODER_PREFERENCE if encoder in listed and encoder_works(encoder)]
+    save_json_cache('encoders.json', {'key': cache_key, 'encoders': encoders})
+    return encoders
+
+def select_encoder():
+    """Pick the best video encoder this machine's ffmpeg can actually use."""
+    encoders = probe_encoders()
+    if not encoders:
+        raise RuntimeError("ffmpeg does not provide any of the supported video encoders: " + ', '.join(ENCODER_PREFERENCE))
+    return encoders[0]
+
+# Scaler flags by speed tier. Hardware encoders and very high pixel rates use the cheaper
+# scaler so scaling does not become the bottleneck of the encode.
+SCALER_FLAGS = {'quality': 'lanczos', 'fast': 'bicubic'}
+FAST_SCALER_PIXEL_RATE = 3840 * 2160 * 60
+
+# 10-bit 4:2:0 pixel format each encoder accepts, where it differs from yuv420p10le
+TEN_BIT_420_PIX_FMTS = {'hevc_nvenc': 'p010le', 'hevc_qsv': 'p010le'}
+
+def parse_frame_rate(rate):
+    numerator, _, denominator = (rate or '0/1').partition('/')
+    try:
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def plan_video_filters(source_video, target_height, encoder, video_args, color_args):
+    """Build the smallest filter graph that takes the source_video stream to the requested profile.
+
+    Returns the filters, the video arguments, the color arguments and notes on what was skipped.
+    """
+    width, height = int(source_video.get('width') or 0), int(source_video.get('height') or 0)
+    fps = parse_frame_rate(source_video.get('avg_frame_rate') or source_video.get('r_frame_rate'))
+    source_pix_fmt = source_video.get('pix_fmt') or ''
+    notes = []
+
+    filters = []
+    if target_height:
+        if height >= target_height:
+            notes.append(f"scale skipped, the source is already {width}x{height}")
+        else:
+            target_width = target_height * 16 // 9
+            fast = encoder not in SOFTWARE_ENCODERS or target_width * target_height * fps > FAST_SCALER_PIXEL_RATE
+            filters.append(f"scale={target_width}:{target_height}:flags={SCALER_FLAGS['fast' if fast else 'quality']}")
+    filters.append(SHARPEN_FILTER)
+    if encoder == 'hevc_vaapi':
+        filters.append('format=nv12,hwupload')
+
+    video_args = list(video_args)
+    if '-pix_fmt' in video_args and source_pix_fmt:
+        index = video_args.index('-pix_fmt') + 1
+        if '444' in video_args[index] and '444' not in source_pix_fmt:
+            ten_bit = any(depth in source_pix_fmt for depth in ('10', '12', '16')) or 'main10' in video_args
+            video_args[index] = TEN_BIT_420_PIX_FMTS.get(encoder, 'yuv420p10le') if ten_bit else 'yuv420p'
+            notes.append(f"4:4:4 conversion skipped, the source is {source_pix_fmt}")
+
+    if color_args and source_video.get('color_primaries') != 'bt2020':
+        color_args = []
+        for option, key in (('-colorspace', 'color_space'), ('-color_primaries', 'color_primaries'), ('-color_trc', 'color_transfer')):
+            if source_video.get(key) not in (None, 'unknown'):
+                color_args += [option, source_video[key]]
+        notes.append(f"BT.2020 tagging skipped, the source is {source_video.get('color_primaries') or 'untagged'}")
+    elif color_args and source_video.get('color_transfer') not in (None, 'unknown'):
+        color_args = color_args + ['-color_primaries', 'bt2020', '-color_trc', source_video['color_transfer']]
+    return filters, video_args, color_args, notes
+
+def get_encode_args(force8K, force4K, force2K, lowPerformance, encoder=None, trimmed=False, source_video=None):
+    """Build the ffmpeg arguments for the requested quality settings.
+
+    With source_video (the ffprobe stream of the source video) the filter graph is planned
+    for that source by plan_video_filters and printed; without it the fixed graph is used.
+    Returns the options that go before the inputs and the output options.
+    """
+    encoder = encoder or select_encoder()
+    profile = 'lowPerformance' if lowPerformance else 'high'
+    target_height = get_target_height(force8K, force4K, force2K, lowPerformance)
+
+    video_args = ENCODER_PROFILES[encoder][profile]
+    color_args = [] if lowPerformance else [
+        '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
+    ]
+    if source_video:
+        filters, video_args, color_args, notes = plan_video_filters(source_video, target_height, encoder, video_args, color_args)
+        print(f"Filter graph: {','.join(filters)}")
+        for note in notes:
+            print(f"  {note}")
+    else:
+        filters = [f'scale={target_height * 16 // 9}:{target_height}'] if target_height else []
+        filters.append(SHARPEN_FILTER)  # sharpen for better quality
+        if encoder == 'hevc_vaapi':
+            filters.append('format=nv12,hwupload')
+
+    output_args = ['-c:v', encoder] + video_args
+    if not lowPerformance:
+        output_args += ['-c:a', 'flac']  # Use FLAC audio codec for lossless audio, AAC for faster encoding
+    else:
+        output_args += ['-c:a', 'aac' if trimmed else 'flac']
+    output_args += color_args + ['-vf', ','.join(filters)]
+    return get_encoder_input_args(encoder), output_args
+
+# Where per-stage metrics go (see configure_metrics), plus the running totals behind them
+metrics_sink = {'file': None, 'prometheus': None, 'lock': threading.Lock(), 'stages': {}, 'ffmpeg_totals': {},
+                'job_numbers': itertools.count(1)}
+
+def configure_metrics(jsonl_path=None, prometheus_path=None):
+    """Emit metrics as JSON lines to jsonl_path ('-' for stdout) and/or keep a Prometheus textfile.
+
+    With '-' stdout carries nothing but the JSON lines: everything else written to it, by
+    this process or the ones it starts, goes to stderr instead.
+    """
+    if jsonl_path == '-':
+        sys.stdout.flush()
+        metrics_sink['file'] = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    elif jsonl_path:
+        metrics_sink['file'] = open(jsonl_path, 'a', encoding='utf-8')
+    metrics_sink['prometheus'] = prometheus_path
+
+def new_metrics_job(url):
+    """Return the id metrics of one job on url are reported under, '<url>#<n>'.
+
+    The number keeps concurrent jobs on the same URL apart within this process.
+    """
+    return f"{url}#{next(metrics_sink['job_numbers'])}"
+
+def metrics_enabled():
+    return metrics_sink['file'] is not None or metrics_sink['prometheus'] is not None
+
+def emit_metric(event, stage, job, **values):
+    """Write one JSON line with the given values; None values are left out."""
+    if metrics_sink['file'] is None:
+        return
+    record = {'time': round(time.time(), 3), 'event': event, 'stage': stage, 'job': job}
+    record.update((key, round(value, 3) if isinstance(value, float) else value)
+                  for key, value in values.items() if value is not None)
+    with metrics_sink['lock']:
+        metrics_sink['file'].write(json.dumps(record) + '\n')
+        metrics_sink['file'].flush()
+
+def write_prometheus_textfile(path):
+    """Write the stage totals in the Prometheus text format, atomically as the textfile collector expects."""
+    metrics = [
+        ('youtube_installer_stage_seconds_total', 'counter', 'Wall time spent in each pipeline stage.', 'seconds'),
+        ('youtube_installer_stage_bytes_total', 'counter', 'Bytes handled by each pipeline stage.', 'bytes'),
+        ('youtube_installer_stage_runs_total', 'counter', 'Finished runs of each pipeline stage.', 'runs'),
+        ('youtube_installer_stage_failures_total', 'counter', 'Failed runs of each pipeline stage.', 'failures'),
+        ('youtube_installer_stage_last_fps', 'gauge', 'Frames per second of the last run of each stage.', 'fps'),
+    ]
+    lines = []
+    with metrics_sink['lock']:
+        for name, metric_type, description, key in metrics:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {metric_type}']
+            for stage, totals in sorted(metrics_sink['stages'].items()):
+                if key in totals:
+                    lines.append(f'{name}{{stage="{stage}"}} {totals[key]}')
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as textfile:
+        textfile.write('\n'.join(lines) + '\n')
+    os.replace(temp_path, path)
+
+@contextlib.contextmanager
+def measure_stage(stage, job):
+    """Time one stage of a job and emit it as a 'stage' metric when it ends.
+
+    The caller may set 'bytes' in the yielded dict. Frames and media time reported by the
+    ffmpeg runs of the same stage and job (see run_ffmpeg) become fps and a speed multiplier.
+    """
+    values = {}
+    started = time.monotonic()
+    status = 'failed'
+    try:
+        yield values
+        status = 'ok'
+    finally:
+        if metrics_enabled():
+            seconds = time.monotonic() - started
+            with metrics_sink['lock']:
+                ffmpeg_totals = metrics_sink['ffmpeg_totals'].pop((stage, job), None)
+                if ffmpeg_totals and seconds > 0:
+                    values['fps'] = ffmpeg_totals['frames'] / seconds
+                    values['speed'] = ffmpeg_totals['media_seconds'] / seconds
+                totals = metrics_sink['stages'].setdefault(stage, {'seconds': 0.0, 'bytes': 0, 'runs': 0, 'failures': 0})
+                totals['seconds'] += seconds
+                totals['bytes'] += values.get('bytes') or 0
+                totals['runs' if status == 'ok' else 'failures'] += 1
+                if 'fps' in values:
+                    totals['fps'] = round(values['fps'], 3)
+            emit_metric('stage', stage, job, status=status, seconds=seconds, **values)
+            if metrics_sink['prometheus']:
+                write_prometheus_textfile(metrics_sink['prometheus'])
+
+def make_download_hook(job):
+    """Return a yt-dlp progress hook that emits download progress at most once a second per file."""
+    last_emit = {}
+
+    def hook(progress):
+        file_name = os.path.basename(progress.get('filename') or '')
+        if progress['status'] == 'downloading' and time.monotonic() - last_emit.get(file_name, 0) < 1:
+            return
+        last_emit[file_name] = time.monotonic()
+        emit_metric('progress', 'download', job, status=progress['status'], file=file_name,
+                    bytes=progress.get('downloaded_bytes'),
+                    total_bytes=progress.get('total_bytes') or progress.get('total_bytes_estimate'),
+                    bytes_per_second=progress.get('speed'), seconds=progress.get('elapsed'))
+    return hook
+
+def add_metrics_hooks(ydl, job):
+    if metrics_enabled():
+        ydl.add_progress_hook(make_download_hook(job))
+
+def parse_progress_number(value):
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+def watch_ffmpeg_progress(stream, stage, job):
+    """Read ffmpeg '-progress' output, emitting it about once a second and totalling each run.
+
+    Each finished run adds its frames and output media time to the totals measure_stage
+    turns into fps and speed for the stage.
+    """
+    block = {}
+    last_emit = 0.0
+    for line in stream:
+        key, _, value = line.strip().partition('=')
+        block[key] = value
+        if key != 'progress':
+            continue
+        frames = int(parse_progress_number(block.get('frame')) or 0)
+        media_seconds = (parse_progress_number(block.get('out_time_us')) or 0) / 1e6
+        if value == 'end':
+            with metrics_sink['lock']:
+                totals = metrics_sink['ffmpeg_totals'].setdefault((stage, job), {'frames': 0, 'media_seconds': 0.0})
+                totals['frames'] += frames
+                totals['media_seconds'] += media_seconds
+        if value == 'end' or time.monotonic() - last_emit >= 1:
+            last_emit = time.monotonic()
+            emit_metric('progress', stage, job, frame=frames, fps=parse_progress_number(block.get('fps')),
+                        media_seconds=media_seconds, bytes=int(parse_progress_number(block.get('total_size')) or 0),
+                        speed=parse_progress_number(block.get('speed')))
+        block = {}
+
+def get_progress_command(command):
+    return command[:1] + ['-progress', 'pipe:1', '-nostats'] + command[1:]
+
+def run_ffmpeg(command, stage, job):
+    """Run an ffmpeg command, reporting its progress as metrics when they are enabled."""
+    if not metrics_enabled():
+        subprocess.run(command, check=True)
+        return
+    process = subprocess.Popen(get_progress_command(command), stdout=subprocess.PIPE, text=True)
+    try:
+        watch_ffmpeg_progress(process.stdout, stage, job)
+    finally:
+        process.stdout.close()
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+
+yt_dlp = None
+
+def load_yt_dlp():
+    """Import yt_dlp on first use, installing it with pip if it is missing."""
+    global yt_dlp
+    if yt_dlp is None:
+        try:
+            import yt_dlp as module
+        except ImportError:
+            subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'yt-dlp'])
+            import yt_dlp as module
+        yt_dlp = module
+    return yt_dlp
+
+def preload_yt_dlp():
+    try:
+        import yt_dlp
+    except ImportError:
+        pass  # load_yt_dlp installs it when it is first needed
+
+def get_work_folder(destination_folder):
+    """Return the folder used for intermediate downloads inside the destination folder."""
+    work_folder = os.path.join(destination_folder, '.partial')
+    os.makedirs(work_folder, exist_ok=True)
+    return work_folder
+
+# Seconds fetched on either side of a requested time range so the precise trim
+# afterwards still has a keyframe to start decoding from
+RANGE_FETCH_MARGIN = 5
+
+def plan_fetch_windows(time_ranges):
+    """Group time ranges into the (start, end) second windows to fetch.
+
+    Every range is widened by RANGE_FETCH_MARGIN on each side and ranges whose windows
+    overlap share one window. Returns the windows and, for every range, the index of its
+    window and the range relative to the start of that window.
+    """
+    bounds = [get_range_seconds(time_range) for time_range in time_ranges]
+    windows = []
+    for start, end in sorted(bounds):
+        fetch_start, fetch_end = max(start - RANGE_FETCH_MARGIN, 0), end + RANGE_FETCH_MARGIN
+        if windows and fetch_start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], fetch_end))
+        else:
+            windows.append((fetch_start, fetch_end))
+    placements = []
+    for start, end in bounds:
+        index = next(i for i, (fetch_start, fetch_end) in enumerate(windows) if fetch_start <= start and end <= fetch_end)
+        placements.append((index, make_time_range(start - windows[index][0], end - windows[index][0])))
+    return windows, placements
+
+def get_output_name(time_range=None):
+    """Return the yt-dlp output template of a job's file name, without the extension.
+
+    Names carry the video id, so videos that share a title don't overwrite each other, and
+    the trimmed ranges in seconds, so jobs cutting other parts of one video don't either.
+    """
+    name = '%(title)s-%(id)s'
+    for time_range in [time_range] if isinstance(time_range, str) else list(time_range or []):
+        name += '_{}-{}'.format(*get_range_seconds(time_range))
+    return name
+
+def get_clip_path(output_path, index):
+    root, ext = os.path.splitext(output_path)
+    return f'{root}_clip{index}{ext}'
+
+def make_source(url, output_path, clips, cleanup_folder, job=None):
+    """Build the source dict for a list of (stream paths, time range) clips of the video at url.
+
+    A single clip is described by the top-level 'paths' and 'time_range'. Several clips
+    also get a 'clips' list with the 'paths', 'time_range' and 'output_path' of each,
+    while 'paths' then lists every stream file. 'job' is the id the job's metrics are
+    reported under (see new_metrics_job), a new one unless given.
+    """
+    source = {'url': url, 'paths': clips[0][0], 'output_path': output_path, 'time_range': clips[0][1],
+              'cleanup_folder': cleanup_folder, 'job': job or new_metrics_job(url)}
+    if len(clips) > 1:
+        source['paths'] = list(dict.fromkeys(path for paths, _ in clips for path in paths))
+        source['time_range'] = None
+        source['clips'] = [{'paths': paths, 'time_range': time_range, 'output_path': get_clip_path(output_path, index)}
+                           for index, (paths, time_range) in enumerate(clips, 1)]
+    return source
+
+def get_output_paths(source):
+    return [clip['output_path'] for clip in source['clips']] if source.get('clips') else [source['output_path']]
+
+# Output heights of the forced resolutions; the source only has to reach these
+TARGET_HEIGHTS = {'8k': 4320, '4k': 2160, '2k': 1080}
+
+# Rough figures for the source format cost model: how fast bytes download and how many
+# pixels per second a decoder gets through for each codec (AV1 is the slowest to decode)
+DOWNLOAD_BYTES_PER_SECOND = 20e6
+DECODE_PIXELS_PER_SECOND = {'avc1': 500e6, 'h264': 500e6, 'vp9': 300e6, 'vp09': 300e6,
+                            'hev1': 300e6, 'hvc1': 300e6, 'hevc': 300e6, 'av01': 150e6, 'av1': 150e6}
+DEFAULT_DECODE_PIXELS_PER_SECOND = 200e6
+
+def get_target_height(force8K, force4K, force2K, lowPerformance):
+    """Return the output height a re-encode scales to, or None when the source resolution is kept."""
+    if lowPerformance:
+        return None  # The low performance profile never scales
+    if force8K:
+        return TARGET_HEIGHTS['8k']
+    if force4K:
+        return TARGET_HEIGHTS['4k']
+    if force2K:
+        return TARGET_HEIGHTS['2k']
+    return None
+
+def format_cost(stream_format):
+    """Estimate the seconds it takes to download and decode one second of a video format."""
+    codec = (stream_format.get('vcodec') or '').split('.')[0]
+    height = stream_format['height']
+    pixels = (stream_format.get('width') or height * 16 // 9) * height * (stream_format.get('fps') or 30)
+    return (stream_format['tbr'] * 125 / DOWNLOAD_BYTES_PER_SECOND +
+            pixels / DECODE_PIXELS_PER_SECOND.get(codec, DEFAULT_DECODE_PIXELS_PER_SECOND))
+
+def get_format_size(stream_format):
+    return stream_format.get('filesize') or stream_format.get('filesize_approx') or 0
+
+def select_formats(formats, target_height):
+    """Pick the cheapest formats that still reach target_height, or None if none can be rated.
+
+    Sources taller than any available format fall back to the tallest ones. The best
+    audio-only format is added unless the chosen video format already carries audio.
+    """
+    videos = [f for f in formats if f.get('vcodec') not in (None, 'none') and f.get('height') and f.get('tbr')]
+    if not videos:
+        return None
+    min_height = min(target_height, max(f['height'] for f in videos))
+    video = min((f for f in videos if f['height'] >= min_height), key=format_cost)
+    audios = [f for f in formats if f.get('acodec') not in (None, 'none') and f.get('vcodec') == 'none']
+    if video.get('acodec') not in (None, 'none') or not audios:
+        return [video]
+    return [video, max(audios, key=lambda f: f.get('abr') or f.get('tbr') or 0)]
+
+def get_source_formats(info, target_height=None, quiet=False):
+    """Return the formats to download for an extracted video.
+
+    Without a target height these are the ones yt-dlp picked ('bestvideo+bestaudio/best').
+    With one, the cheapest source that still reaches it is used instead and the decision
+    is printed along with the estimated bytes saved.
+    """
+    best_formats = info.get('requested_formats') or [info]
+    chosen = select_formats(info.get('formats') or [], target_height) if target_height else None
+    if not chosen:
+        return best_formats
+    if not quiet and [f.get('format_id') for f in chosen] != [f.get('format_id') for f in best_formats]:
+        best_video, video = best_formats[0], chosen[0]
+        print(f"Using format {video['format_id']} ({video.get('width')}x{video['height']} {video.get('vcodec')}) "
+              f"instead of {best_video.get('format_id')} ({best_video.get('width')}x{best_video.get('height')} "
+              f"{best_video.get('vcodec')}) for a {target_height}p output")
+        saved = sum(get_format_size(f) for f in best_formats) - sum(get_format_size(f) for f in chosen)
+        if saved > 0:
+            print(f"Estimated download saving: ~{saved / 1e6:.1f} MB")
+    return chosen
+
+def get_ydl_opts(destination_folder, download_thumbnail, quiet=False):
+    """Return the yt-dlp options jobs extract with; only the thumbnail (when asked for) is written."""
+    return {
         'format': 'bestvideo+bestaudio/best',
-        'outtmpl': os.path.join(destination_folder, '%(title)s.%(ext)s'),
-        'merge_output_format': 'mp4', # mkv for better quality but more storage, mp4 for worse quality but less storage
+        'outtmpl': {'thumbnail': os.path.join(destination_folder, get_output_name() + '.%(ext)s')},
         'writethumbnail': download_thumbnail,
-        'restrictfilenames': True
+        'skip_download': True,
+        'restrictfilenames': True,
+        'quiet': quiet,
+        'noprogress': quiet,
+    }
+
+def download_stream(ydl, info, stream_format, path, section=None):
+    """Download one format of an extracted video to path, optionally only the (start, end) section in seconds."""
+    stream_info = dict(info)
+    stream_info.pop('requested_formats', None)
+    stream_info.update(stream_format)
+    if section:
+        stream_info['section_start'], stream_info['section_end'] = section
+    part_path = path + '.part'
+    try:
+        success, _ = ydl.dl(part_path, stream_info)
+        if not success:
+            raise RuntimeError(f"Downloading format {stream_format['format_id']} of {info['id']} failed")
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(part_path)
+        raise
+    os.replace(part_path, path)
+
+def download_section(ydl, info, stream_formats, folder, section):
+    """Download the (start, end) second section of the given formats and return the file paths.
+
+    Several formats are cut together by a single ffmpeg run into one file. Cut one at a
+    time, each would snap to its own keyframe before the start, so the video could begin up
+    to a GOP earlier than the audio while both files still start at zero.
+    """
+    if len(stream_formats) == 1:
+        path = get_stream_path(folder, stream_formats[0])
+        download_stream(ydl, info, stream_formats[0], path, section)
+        return [path]
+    merged_format = {
+        'requested_formats': stream_formats,
+        'format_id': '+'.join(f['format_id'] for f in stream_formats),
+        'url': '\n'.join(f['url'] for f in stream_formats),
+        'protocol': '+'.join(f.get('protocol') or yt_dlp.utils.determine_protocol(f) for f in stream_formats),
+        'ext': 'mkv',  # Holds any mix of codecs the formats may use
     }
+    path = get_stream_path(folder, merged_format)
+    download_stream(ydl, info, merged_format, path, section)
+    return [path]
+
+def get_section_offset(path):
+    """Return how far into a section download the requested section start lies, in seconds.
+
+    The video of a cut begins at the keyframe before the start and is shifted to zero, while
+    the audio is cut on the start itself, so the latest-starting stream marks it. A file
+    without audio has nothing to go by and is taken to begin on the start.
+    """
+    starts = [float(stream['start_time']) for stream in probe_media(path)['streams']
+              if stream.get('start_time') not in (None, 'N/A')]
+    return max(starts, default=0.0)
+
+def fetch_source(url, destination_folder, download_thumbnail, time_range=None, range_fetch=True, quiet=False, cache=None, target_height=None, info=None, work_folder=None):
+    """Download the video and audio streams of url (or only its time_range) as separate files.
+
+    Returns a source dict (see make_source); the streams come from fetch_cached_source with a cache.
+    """
+    if cache:
+        return fetch_cached_source(url, destination_folder, download_thumbnail, time_range, cache, quiet, target_height)
+
+    load_yt_dlp()
+    job = new_metrics_job(url)
+    time_ranges = [time_range] if isinstance(time_range, str) else list(time_range or [None])
+    if time_range and range_fetch:
+        windows, placements = plan_fetch_windows(time_ranges)
+    else:
+        windows, placements = [None], [(0, time_range) for time_range in time_ranges]
 
-    # Postprocessor arguments for ffmpeg with NVENC hardware acceleration
+    with yt_dlp.YoutubeDL(get_ydl_opts(destination_folder, download_thumbnail, quiet)) as ydl:
+        add_metrics_hooks(ydl, job)
+        if info is None:
+            # skip_download makes this write only the thumbnail (when asked for)
+            with measure_stage('extract', job):
+                info = ydl.extract_info(url, download=True)
+        output_path = ydl.prepare_filename(info, outtmpl=os.path.join(destination_folder, get_output_name(time_range) + '.mp4'))
+        if work_folder:
+            job_folder = work_folder
+            os.makedirs(job_folder, exist_ok=True)
+        else:
+            job_folder = tempfile.mkdtemp(prefix=f"{info['id']}-", dir=get_work_folder(destination_folder))
+        formats = get_source_formats(info, target_height)
+        window_paths = []
+        try:
+            with measure_stage('download', job) as stage:
+                for index, window in enumerate(windows):
+                    window_folder = os.path.join(job_folder, str(index)) if len(windows) > 1 else job_folder
+                    os.makedirs(window_folder, exist_ok=True)
+                    if window:
+                        window_paths.append(download_section(ydl, info, formats, window_folder, window))
+                        continue
+                    window_paths.append([])
+                    for stream_format in formats:
+                        window_paths[-1].append(get_stream_path(window_folder, stream_format))
+                        download_stream(ydl, info, stream_format, window_paths[-1][-1])
+                stage['bytes'] = sum(os.path.getsize(path) for paths in window_paths for path in paths)
+            offsets = [get_section_offset(paths[0]) if window else 0 for window, paths in zip(windows, window_paths)]
+        except BaseException:
+            shutil.rmtree(job_folder, ignore_errors=True)  # Don't leave partial streams behind
+            raise
+
+    if windows[0]:
+        full_size = sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in formats)
+        fetched_size = sum(os.path.getsize(path) for paths in window_paths for path in paths)
+        if full_size > fetched_size:
+            print(f"Fetched {fetched_size / 1e6:.1f} MB instead of ~{full_size / 1e6:.1f} MB "
+                  f"(saved ~{(full_size - fetched_size) / 1e6:.1f} MB)")
+
+    clips = []
+    for index, relative_range in placements:
+        if windows[index]:
+            start, end = get_range_seconds(relative_range)
+            relative_range = make_time_range(start + offsets[index], end + offsets[index])
+        clips.append((window_paths[index], relative_range))
+    return make_source(url, output_path, clips, job_folder, job)
+
+DEFAULT_CACHE_SIZE = 50 * 1000 ** 3
+
+@contextlib.contextmanager
+def file_lock(lock_path, blocking=True):
+    """Hold an exclusive lock on lock_path, shared between processes.
+
+    With blocking=False a BlockingIOError is raised when another process holds the lock.
+    """
+    with open(lock_path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if not blocking:
+                        raise BlockingIOError(f"{lock_path} is locked")
+                    time.sleep(0.1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_stream_cache(cache_size=DEFAULT_CACHE_SIZE, cache_dir=None):
+    """Describe the stream cache: where it lives and how many bytes it may use."""
+    cache_dir = cache_dir or os.path.join(get_cache_dir(), 'streams')
+    os.makedirs(cache_dir, exist_ok=True)
+    return {'dir': cache_dir, 'budget': cache_size}
+
+def get_cache_entry_dir(cache, extractor_key, video_id):
+    entry_dir = os.path.join(cache['dir'], re.sub(r'[^\w.-]', '_', f'{extractor_key}-{video_id}'))
+    os.makedirs(entry_dir, exist_ok=True)
+    return entry_dir
+
+def get_offline_video_key(url):
+    """Work out the extractor and video id of a URL without touching the network."""
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.ie_key() != 'Generic' and ie.suitable(url):
+            video_id = ie.get_temp_id(url)
+            return (ie.ie_key(), video_id) if video_id else None
+    return None
+
+def get_stream_path(folder, stream_format):
+    return os.path.join(folder, re.sub(r'[^\w.-]', '_', stream_format['format_id']) + '.' + stream_format['ext'])
+
+# Open in-use locks of cache entries, by lock path; released when their source is removed
+held_cache_entries = {}
+
+def hold_cache_entry(entry_dir):
+    """Mark a cache entry as in use until release_cache_entry, so no eviction deletes its streams.
+
+    Must be called while holding the entry's .lock. Returns the in-use lock path.
+    """
+    lock_path = os.path.join(entry_dir, f'.in-use-{uuid.uuid4().hex}')
+    stack = contextlib.ExitStack()
+    stack.enter_context(file_lock(lock_path))
+    held_cache_entries[lock_path] = stack
+    return lock_path
+
+def release_cache_entry(lock_path):
+    stack = held_cache_entries.pop(lock_path, None)
+    if stack is not None:
+        stack.close()
+    with contextlib.suppress(OSError):
+        os.remove(lock_path)
+
+def reclaim_source(source):
+    """Check a stored source's streams are still there, holding its cache entry again if it has one.
+
+    Used when a restarted process picks a source up; updates source['cache_lock'].
+    """
+    if not source.get('cache_lock'):
+        return all(os.path.exists(path) for path in source['paths'])
+    entry_dir = os.path.dirname(source['cache_lock'])
+    with file_lock(os.path.join(entry_dir, '.lock')):
+        release_cache_entry(source['cache_lock'])  # Left behind by the process that died
+        if not all(os.path.exists(path) for path in source['paths']):
+            source['cache_lock'] = None
+            return False
+        source['cache_lock'] = hold_cache_entry(entry_dir)
+    return True
+
+def cache_entry_in_use(entry_dir):
+    """Whether any job, in this process or another, holds an in-use lock on the entry.
+
+    In-use lock files left behind by a crashed job are deleted.
+    """
+    for file_name in os.listdir(entry_dir):
+        if not file_name.startswith('.in-use-'):
+            continue
+        lock_path = os.path.join(entry_dir, file_name)
+        try:
+            with file_lock(lock_path, blocking=False):
+                pass
+        except OSError:
+            return True
+        with contextlib.suppress(OSError):
+            os.remove(lock_path)
+    return False
+
+def evict_stream_cache(cache):
+    """Delete the least recently used streams until the cache fits its byte budget.
+
+    Entries that a job is fetching or still encoding from are skipped.
+    """
+    with file_lock(os.path.join(cache['dir'], '.lock')):
+        streams = []
+        for entry_name in os.listdir(cache['dir']):
+            entry_dir = os.path.join(cache['dir'], entry_name)
+            if not os.path.isdir(entry_dir):
+                continue
+            for file_name in os.listdir(entry_dir):
+                if file_name.endswith('.part'):
+                    with contextlib.suppress(OSError), file_lock(os.path.join(entry_dir, '.lock'), blocking=False):
+                        os.remove(os.path.join(entry_dir, file_name))  # Left by a download that died
+                    continue
+                if file_name == 'info.json' or file_name.startswith('.'):
+                    continue
+                stat = os.stat(os.path.join(entry_dir, file_name))
+                streams.append((stat.st_mtime, stat.st_size, entry_dir, file_name))
+
+        total_size = sum(stream[1] for stream in streams)
+        for mtime, size, entry_dir, file_name in sorted(streams):
+            if total_size <= cache['budget']:
+                break
+            try:
+                with file_lock(os.path.join(entry_dir, '.lock'), blocking=False):
+                    if cache_entry_in_use(entry_dir):
+                        continue
+                    os.remove(os.path.join(entry_dir, file_name))
+                total_size -= size
+            except OSError:
+                continue  # In use by another job or already gone
+
+def fetch_cached_source(url, destination_folder, download_thumbnail, time_range, cache, quiet=False, target_height=None):
+    """Like fetch_source, but takes the raw streams from the local stream cache, downloading missing ones.
+
+    The entry is held in use until remove_source so eviction cannot delete it mid-encode.
+    """
+    load_yt_dlp()
+    job = new_metrics_job(url)
+    with yt_dlp.YoutubeDL(get_ydl_opts(destination_folder, download_thumbnail, quiet)) as ydl:
+        add_metrics_hooks(ydl, job)
+        info = None
+        video_key = get_offline_video_key(url)
+        if video_key:
+            entry_dir = get_cache_entry_dir(cache, *video_key)
+            try:
+                with open(os.path.join(entry_dir, 'info.json'), encoding='utf-8') as info_file:
+                    info = json.load(info_file)
+            except (OSError, ValueError):
+                info = None
+            formats = get_source_formats(info, target_height, quiet=True) if info else []
+            if not formats or not all(os.path.exists(get_stream_path(entry_dir, f)) for f in formats):
+                info = None
+        if info is None:
+            with measure_stage('extract', job):
+                info = ydl.extract_info(url, download=False)
+            entry_dir = get_cache_entry_dir(cache, info['extractor_key'], info['id'])
+            save_info = ydl.sanitize_info(info)
+        else:
+            save_info = None
+            if not quiet:
+                print(f"Using cached streams for {info['id']}")
+        if download_thumbnail:
+            ydl.process_info(dict(info))
+        output_path = ydl.prepare_filename(info, outtmpl=os.path.join(destination_folder, get_output_name(time_range) + '.mp4'))
+
+        stream_paths = []
+        with file_lock(os.path.join(entry_dir, '.lock')):
+            if save_info is not None:
+                with open(os.path.join(entry_dir, 'info.json'), 'w', encoding='utf-8') as info_file:
+                    json.dump(save_info, info_file)
+            with measure_stage('download', job) as stage:
+                stage['bytes'] = 0
+                for stream_format in get_source_formats(info, target_height):
+                    stream_path = get_stream_path(entry_dir, stream_format)
+                    if not os.path.exists(stream_path):
+                        download_stream(ydl, info, stream_format, stream_path)
+                        stage['bytes'] += os.path.getsize(stream_path)
+                    os.utime(stream_path)
+                    stream_paths.append(stream_path)
+            in_use_lock = hold_cache_entry(entry_dir)
+
+    evict_stream_cache(cache)
+    time_ranges = [time_range] if isinstance(time_range, str) else list(time_range or [None])
+    source = make_source(url, output_path, [(stream_paths, time_range) for time_range in time_ranges], None, job)
+    source['cache_lock'] = in_use_lock
+    return source
+
+def get_input_args(paths, time_range=None, first_index=0):
+    """Build the ffmpeg inputs for the stream files of a source, each seeked to the time range.
+
+    Returns the input arguments and the '-map' arguments that select every input stream,
+    numbering the inputs from first_index.
+    """
+    seek_args = []
     if time_range:
-        start_time, end_time = time_range.lstrip('*').split('-')
-
-        if lowPerformance != True:
-            if force8K:
-                ydl_opts['postprocessor_args'] = [
-                    '-ss', start_time,
-                    '-to', end_time,
-                    '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                    '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                    '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                    '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                    '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                    '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                    '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                    '-rc-lookahead', '32',  # Enhance future frame prediction
-                    '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                    '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                    '-vf', 'scale=7680:4320,unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
-            elif force4K:
-                ydl_opts['postprocessor_args'] = [
-                    '-ss', start_time,
-                    '-to', end_time,
-                    '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                    '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                    '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                    '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                    '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                    '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                    '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                    '-rc-lookahead', '32',  # Enhance future frame prediction
-                    '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                    '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                    '-vf', 'scale=3840:2160,unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
-            elif force2K:
-                ydl_opts['postprocessor_args'] = [
-                    '-ss', start_time,
-                    '-to', end_time,
-                    '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                    '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                    '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                    '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                    '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                    '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                    '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                    '-rc-lookahead', '32',  # Enhance future frame prediction
-                    '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                    '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                    '-vf', 'scale=1920:1080,unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
+        start, end = get_range_seconds(time_range)
+        seek_args = ['-ss', str(start), '-to', str(end)]
+    input_args = []
+    map_args = []
+    for index, path in enumerate(paths):
+        input_args += seek_args + ['-i', path]
+        map_args += ['-map', str(first_index + index)]
+    return input_args, map_args
+
+def remove_source(source):
+    if source.get('cache_lock'):
+        release_cache_entry(source['cache_lock'])
+    if source.get('cleanup_folder'):
+        shutil.rmtree(source['cleanup_folder'], ignore_errors=True)
+
+def encode_source(source, output_args, global_args=(), stage='encode'):
+    """Produce the final video from a source's separate stream files in a single ffmpeg run.
+
+    Trimming, filtering, encoding and muxing all happen in this one pass, so no merged
+    intermediate file is ever written. A source with several clips becomes one ffmpeg run
+    with an output per clip, each reading only its own range, so no part of the source is
+    decoded twice. Progress is reported under stage (see run_ffmpeg).
+    """
+    clips = source.get('clips') or [source]
+    command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error'] + list(global_args)
+    outputs = []
+    for clip in clips:
+        input_args, map_args = get_input_args(clip['paths'], clip['time_range'], command.count('-i'))
+        command += input_args
+        outputs += map_args + output_args + [clip['output_path']]
+    run_ffmpeg(command + outputs, stage, source['job'])
+
+# Encoders that run on the CPU and therefore benefit from chunked encoding
+SOFTWARE_ENCODERS = {'libx265', 'libx264', 'libsvtav1'}
+
+DEFAULT_SEGMENT_LENGTH = 30
+
+def probe_media(path):
+    """Return ffprobe's format and stream information for a media file."""
+    result = subprocess.run(['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    return json.loads(result.stdout)
+
+def probe_video_stream(paths):
+    """Return ffprobe's information on the first video stream among the files, or None."""
+    for path in paths:
+        for stream in probe_media(path)['streams']:
+            if stream.get('codec_type') == 'video':
+                return stream
+    return None
+
+def get_video_packets(path):
+    """List (timestamp, is keyframe) for every video packet, read from the packet index without decoding."""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    packets = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if pts_time not in ('', 'N/A'):
+            packets.append((float(pts_time), 'K' in flags))
+    return packets
+
+def get_keyframe_times(packets):
+    return sorted(pts_time for pts_time, keyframe in packets if keyframe)
+
+def count_video_frames(path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+         '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    return int(result.stdout.strip().strip(','))
+
+def plan_segments(keyframe_times, start, end, segment_length):
+    """Split [start, end) into pieces of at least segment_length seconds that begin on keyframes."""
+    boundaries = [start]
+    for keyframe_time in keyframe_times:
+        if boundaries[-1] + segment_length <= keyframe_time < end - segment_length / 2:
+            boundaries.append(keyframe_time)
+    boundaries.append(end)
+    return list(zip(boundaries, boundaries[1:]))
+
+def split_audio_args(output_args):
+    """Separate the '-c:a' option from the rest of the encode arguments."""
+    video_args = list(output_args)
+    audio_codec = 'copy'
+    if '-c:a' in video_args:
+        index = video_args.index('-c:a')
+        audio_codec = video_args[index + 1]
+        del video_args[index:index + 2]
+    return video_args, audio_codec
+
+def encode_chunked(source, output_args, global_args, workers, segment_length=DEFAULT_SEGMENT_LENGTH):
+    """Encode a source as keyframe-aligned segments in parallel and join them losslessly.
+
+    Every segment gets identical settings, the audio is encoded once on its own, and the
+    pieces are joined with the concat demuxer. The result is checked against the source's
+    frame count in the encoded range and its duration.
+    """
+    video_path = audio_path = None
+    duration = 0.0
+    for path in source['paths']:
+        media = probe_media(path)
+        stream_types = {stream.get('codec_type') for stream in media['streams']}
+        if 'video' in stream_types and video_path is None:
+            video_path = path
+            duration = float(media['format']['duration'])
+        if 'audio' in stream_types and audio_path is None:
+            audio_path = path
+    start, end = 0.0, duration
+    if source['time_range']:
+        start, end = get_range_seconds(source['time_range'])
+        start, end = float(start), min(float(end), duration)
+    packets = get_video_packets(video_path)
+    segments = plan_segments(get_keyframe_times(packets), start, end, segment_length)
+    video_args, audio_codec = split_audio_args(output_args)
+    threads = str(max(1, (os.cpu_count() or 1) // workers))
+    print(f"Encoding {len(segments)} segment(s) with {workers} worker(s)...")
+
+    output_path = source['output_path']
+    chunk_folder = tempfile.mkdtemp(prefix='chunks-', dir=get_work_folder(os.path.dirname(os.path.abspath(output_path))))
+    try:
+        def encode_segment(index, segment):
+            segment_path = os.path.join(chunk_folder, f'segment_{index:05d}.mkv')
+            command = (['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error'] + list(global_args) +
+                       ['-ss', f'{segment[0]:.6f}', '-t', f'{segment[1] - segment[0]:.6f}', '-i', video_path,
+                        '-map', '0:v:0', '-an'] + video_args + ['-threads', threads, segment_path])
+            run_ffmpeg(command, 'encode', source['job'])
+            return segment_path
+
+        encoded_audio_path = os.path.join(chunk_folder, 'audio.mka')
+        audio_command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                         '-ss', f'{start:.6f}', '-t', f'{end - start:.6f}', '-i', audio_path or '',
+                         '-map', '0:a:0', '-vn', '-c:a', audio_codec, encoded_audio_path]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            audio_future = pool.submit(subprocess.run, audio_command, check=True) if audio_path else None
+            segment_paths = list(pool.map(encode_segment, range(len(segments)), segments))
+            if audio_future:
+                audio_future.result()
+
+        list_path = os.path.join(chunk_folder, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as list_file:
+            for segment_path in segment_paths:
+                list_file.write("file '{}'\n".format(segment_path.replace("'", "'\\''")))
+        audio_input = ['-i', encoded_audio_path] if audio_path else []
+        audio_map = ['-map', '1:a'] if audio_path else []
+        subprocess.run(['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                        '-f', 'concat', '-safe', '0', '-i', list_path] + audio_input +
+                       ['-map', '0:v'] + audio_map + ['-c', 'copy', output_path], check=True)
+
+        # Every source frame in [start, end) must come out exactly once, whichever segment it fell in
+        expected_frames = sum(1 for pts_time, _ in packets if start <= pts_time < end)
+        output_frames = count_video_frames(output_path)
+        output_duration = float(probe_media(output_path)['format']['duration'])
+        if output_frames != expected_frames or abs(output_duration - (end - start)) > 0.5:
+            raise RuntimeError(f"Chunked encode mismatch: {output_frames} of {expected_frames} frames, "
+                               f"{output_duration:.2f}s instead of {end - start:.2f}s")
+    finally:
+        shutil.rmtree(chunk_folder, ignore_errors=True)
+
+# Codecs the mp4 muxer accepts as-is, so sources made of them can be stream-copied
+MP4_COPY_CODECS = {'h264', 'hevc', 'av1', 'vp9', 'aac', 'mp3', 'opus', 'flac', 'alac', 'ac3', 'eac3'}
+
+def stream_copy_possible(paths):
+    """Check with ffprobe whether every stream of the source files fits an mp4 container unchanged."""
+    codecs = []
+    for path in paths:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'stream=codec_name', '-of', 'csv=p=0', path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            return False
+        codecs += [line.strip().strip(',') for line in result.stdout.splitlines() if line.strip()]
+    return bool(codecs) and all(codec in MP4_COPY_CODECS for codec in codecs)
+
+# Output options that remux the source streams without re-encoding them. With the time
+# range applied as input seeking, cuts snap to the keyframe before the requested start.
+STREAM_COPY_ARGS = ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+
+def finish_source(source, force8K, force4K, force2K, lowPerformance, sharpen=False, chunked=None, encoder=None):
+    """Turn a fetched source into the final video and remove its temporary files.
+
+    Returns 'copy' when the streams could be copied as they are, otherwise 'encode'.
+    """
+    try:
+        if len(source['paths']) > 1:
+            merged_size = sum(os.path.getsize(path) for path in source['paths'])
+            print(f"Processing the streams in one pass, skipping a {merged_size / 1e6:.1f} MB merged "
+                  f"intermediate (~{2 * merged_size / 1e6:.1f} MB less disk I/O)")
+
+        if not (force8K or force4K or force2K or sharpen) and stream_copy_possible(source['paths']):
+            with measure_stage('copy', source['job']) as stage:
+                encode_source(source, STREAM_COPY_ARGS, stage='copy')
+                stage['bytes'] = sum(os.path.getsize(path) for path in get_output_paths(source))
+            return 'copy'
+
+        encoder = encoder or select_encoder()
+        source_video = probe_video_stream(source['paths'])
+        with measure_stage('encode', source['job']) as stage:
+            if chunked and encoder in SOFTWARE_ENCODERS and not source.get('clips'):
+                global_args, output_args = get_encode_args(force8K, force4K, force2K, lowPerformance, encoder,
+                                                           trimmed=bool(source['time_range']), source_video=source_video)
+                encode_chunked(source, output_args, global_args, chunked['workers'], chunked['segment_length'])
             else:
-                ydl_opts['postprocessor_args'] = [
-                    '-ss', start_time,
-                    '-to', end_time,
-                    '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                    '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                    '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                    '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                    '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                    '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                    '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                    '-rc-lookahead', '32',  # Enhance future frame prediction
-                    '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                    '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                    '-vf', 'unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
+                global_args, output_args = get_encode_args(force8K, force4K, force2K, lowPerformance, encoder,
+                                                           trimmed=bool(source['time_range'] or source.get('clips')),
+                                                           source_video=source_video)
+                encode_source(source, output_args, global_args)
+            stage['bytes'] = sum(os.path.getsize(path) for path in get_output_paths(source))
+        return 'encode'
+    finally:
+        remove_source(source)
+
+# Size of the Range requests a streamed format is read in; like yt-dlp's http_chunk_size
+# this keeps YouTube from throttling one long-running request
+STREAM_CHUNK_SIZE = 10 * 1024 * 1024
+
+def iter_format_chunks(ydl, stream_format, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the bytes of a direct http(s) format as they arrive, using consecutive Range requests."""
+    size = stream_format.get('filesize')
+    position = 0
+    while size is None or position < size:
+        headers = dict(stream_format.get('http_headers') or {})
+        headers['Range'] = f'bytes={position}-{position + chunk_size - 1}'
+        try:
+            response = ydl.urlopen(yt_dlp.networking.Request(stream_format['url'], headers=headers))
+        except yt_dlp.networking.exceptions.HTTPError as e:
+            if e.status == 416 and size is None:
+                return  # The previous chunk ended exactly at the end of the file
+            raise
+        received = 0
+        with response:
+            while True:
+                block = response.read(256 * 1024)
+                if not block:
+                    break
+                received += len(block)
+                yield block
+        position += received
+        if response.status != 206 or received < chunk_size:
+            return
+
+def stream_video(url, destination_folder, download_thumbnail, output_args, global_args=(), target_height=None):
+    """Download and encode a whole video at the same time, piping the video into ffmpeg.
+
+    Returns None once done, or the extracted info for fetch_source when the format can't be streamed.
+    """
+    load_yt_dlp()
+    job = new_metrics_job(url)
+    with yt_dlp.YoutubeDL(get_ydl_opts(destination_folder, download_thumbnail)) as ydl:
+        add_metrics_hooks(ydl, job)
+        with measure_stage('extract', job):
+            info = ydl.extract_info(url, download=True)
+        output_path = ydl.prepare_filename(info, outtmpl=os.path.join(destination_folder, get_output_name() + '.mp4'))
+        formats = get_source_formats(info, target_height)
+        video_format = next((f for f in formats if f.get('vcodec') != 'none'), formats[0])
+        if video_format.get('protocol') not in ('http', 'https'):
+            return info
+
+        job_folder = tempfile.mkdtemp(prefix=f"{info['id']}-", dir=get_work_folder(destination_folder))
+        try:
+            input_paths = []
+            for stream_format in formats:
+                if stream_format is not video_format:
+                    input_paths.append(get_stream_path(job_folder, stream_format))
+                    download_stream(ydl, info, stream_format, input_paths[-1])
+
+            input_args, map_args = get_input_args(['pipe:0'] + input_paths)
+            command = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error'] + list(global_args) + input_args + map_args
+            command += output_args + [output_path]
+            with measure_stage('encode', job) as encode_stage:
+                started = time.monotonic()
+                watcher = None
+                if metrics_enabled():
+                    # stdin carries binary video, so the progress lines are decoded by hand
+                    process = subprocess.Popen(get_progress_command(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+                    lines = (line.decode('utf-8', 'replace') for line in process.stdout)
+                    watcher = threading.Thread(target=watch_ffmpeg_progress, args=(lines, 'encode', job), daemon=True)
+                    watcher.start()
+                else:
+                    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+                with measure_stage('download', job) as download_stage:
+                    download_stage['bytes'] = 0
+                    try:
+                        for block in iter_format_chunks(ydl, video_format):
+                            process.stdin.write(block)
+                            download_stage['bytes'] += len(block)
+                    except BrokenPipeError:
+                        pass  # ffmpeg exited early, its return code tells why
+                    except BaseException:
+                        process.kill()
+                        raise
+                    finally:
+                        try:
+                            process.stdin.close()
+                        except BrokenPipeError:
+                            pass
+                downloaded = time.monotonic()
+                if process.wait() != 0:
+                    raise subprocess.CalledProcessError(process.returncode, command)
+                if watcher:
+                    watcher.join()
+                encode_stage['bytes'] = os.path.getsize(output_path)
+        finally:
+            shutil.rmtree(job_folder, ignore_errors=True)
+
+    finished = time.monotonic()
+    print(f"Download finished after {downloaded - started:.1f}s, encode after {finished - started:.1f}s "
+          f"({finished - downloaded:.1f}s of encoding after the last byte arrived)")
+    return None
+
+def download_video(url, destination_folder, time_range, download_thumbnail, force8K, force4K, force2K, lowPerformance, range_fetch=True, sharpen=False, chunked=None, cache=None, stream=False):
+    """Download a video and turn it into the final file.
+
+    time_range may also be a list of ranges (see parse_time_ranges); each becomes its own
+    clip, all cut from one download by one ffmpeg run. With stream enabled, whole-video re-encodes overlap the download with the encode (see
+    stream_video). Trimmed, stream-copied and cached jobs always download first, since
+    they either fetch little data or do no encoding for the download to overlap with.
+    """
+    target_height = get_target_height(force8K, force4K, force2K, lowPerformance)
+    info = None
+    if stream and not time_range and not cache and (force8K or force4K or force2K or sharpen):
+        global_args, output_args = get_encode_args(force8K, force4K, force2K, lowPerformance)
+        print("Downloading and processing video...")
+        info = stream_video(url, destination_folder, download_thumbnail, output_args, global_args, target_height)
+        if info is None:
+            return
+        print("This video's format can't be streamed, downloading it first.")
+    source = fetch_source(url, destination_folder, download_thumbnail, time_range, range_fetch,
+                          cache=cache, target_height=target_height, info=info)
+    print("Processing video...")
+    if finish_source(source, force8K, force4K, force2K, lowPerformance, sharpen, chunked) == 'copy':
+        print("Copied the original streams, no re-encode was needed.")
+    if source.get('clips'):
+        print(f"Wrote {len(source['clips'])} clips: " + ', '.join(get_output_paths(source)))
+
+def parse_time_range(time_input):
+    """Turn a 'start-end' string such as '6:01-6:50' into a time range (see make_time_range).
+
+    Raises ValueError unless the end comes after the start.
+    """
+    start_time_str, end_time_str = time_input.split('-')
+    start = time_to_seconds(parse_time(start_time_str))
+    end = time_to_seconds(parse_time(end_time_str))
+    if end <= start:
+        raise ValueError(f"The range {time_input} must end after it starts.")
+    return make_time_range(start, end)
+
+def parse_time_ranges(time_input):
+    """Parse comma-separated 'start-end' ranges such as '6:01-6:50, 20:47-23:03'.
+
+    Duplicate and overlapping ranges are merged into one clip. Returns a single time range
+    for one clip and a list of them, ordered by start, for several.
+    """
+    ranges = []
+    for part in time_input.split(','):
+        if part.strip():
+            time_range = parse_time_range(part.strip())
+            ranges.append((*get_range_seconds(time_range), time_range))
+    if not ranges:
+        raise ValueError("No time range given.")
+    merged = []
+    for start, end, time_range in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end, make_time_range(merged[-1][0], end))
         else:
-            ydl_opts['postprocessor_args'] = [
-                '-ss', start_time,
-                '-to', end_time,
-                '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                '-preset', 'p5',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                '-cq', '22',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                '-c:a', 'AAC',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                '-profile:v', 'main',   # Set H.264 profile to main for compatibility with most devices
-                '-vf', 'unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-            ]
-    else:
-        if lowPerformance != True:
-            if force8K:
-                ydl_opts['postprocessor_args'] = [
-                '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                '-rc-lookahead', '32',  # Enhance future frame prediction
-                '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                '-vf', 'scale=7680:4320,unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
-            elif force4K:
-                ydl_opts['postprocessor_args'] = [
-                '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                '-rc-lookahead', '32',  # Enhance future frame prediction
-                '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                '-vf', 'scale=3840:2160,unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
-            elif force2K:
-                ydl_opts['postprocessor_args'] = [
-                '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                '-rc-lookahead', '32',  # Enhance future frame prediction
-                '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                '-vf', 'scale=1920:1080,unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
-            else:
-                ydl_opts['postprocessor_args'] = [
-                    '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                    '-preset', 'p7',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                    '-cq', '18',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                    '-pix_fmt', 'yuv444p',  # Use 4:4:4 chroma subsampling for better quality and retaining color
-                    '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                    '-profile:v', 'main10',   # Set H.264 profile to main for compatibility with most devices
-                    '-colorspace', 'bt2020nc',  # Use BT.2020 color space for better color representation
-                    '-rc-lookahead', '32',  # Enhance future frame prediction
-                    '-spatial-aq', '1',  # Adaptive quantization to preserve details
-                    '-temporal-aq', '1',  # Temporal adaptive quantization for better motion handling
-                    '-vf', 'unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-                ]
+            merged.append((start, end, time_range))
+    if len(merged) < len(ranges):
+        print(f"Merged {len(ranges)} time ranges into {len(merged)} clip(s).")
+    return merged[0][2] if len(merged) == 1 else [time_range for _, _, time_range in merged]
+
+def parse_batch_file(list_path):
+    """Read a URL list file with one job per line.
+
+    Each line holds a URL, optionally followed by a time range ('6:01-6:50', or several
+    separated by commas without spaces to cut multiple clips) and/or a resolution (8K/4K/2K). Blank lines and lines starting with '#' are ignored.
+    A line that can't be parsed becomes a job with an 'error', which run_jobs reports as failed.
+    """
+    jobs = []
+    with open(list_path, encoding='utf-8') as list_file:
+        for line_number, line in enumerate(list_file, 1):
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            job = {'url': fields[0], 'time_range': None, 'resolution': '', 'line': line_number, 'label': f'line {line_number}'}
+            for field in fields[1:]:
+                if field.lower() in ('8k', '4k', '2k'):
+                    job['resolution'] = field.lower()
+                else:
+                    try:
+                        job['time_range'] = parse_time_ranges(field)
+                    except ValueError as e:
+                        job['error'] = ValueError(f"{list_path}:{line_number}: invalid time range '{field}' ({e})")
+            jobs.append(job)
+    return jobs
+
+def new_stage_stats():
+    return {'items': 0, 'bytes': 0, 'busy': 0.0, 'first_start': None, 'last_end': None}
+
+def record_stage(stats, lock, started, size):
+    """Add one finished item to the throughput counters of a pipeline stage."""
+    ended = time.monotonic()
+    with lock:
+        stats['items'] += 1
+        stats['bytes'] += size
+        stats['busy'] += ended - started
+        if stats['first_start'] is None or started < stats['first_start']:
+            stats['first_start'] = started
+        if stats['last_end'] is None or ended > stats['last_end']:
+            stats['last_end'] = ended
+
+def print_stage_stats(name, stats):
+    if not stats['items']:
+        print(f"{name}: no items completed")
+        return
+    wall = max(stats['last_end'] - stats['first_start'], 1e-6)
+    megabytes = stats['bytes'] / 1e6
+    print(f"{name}: {stats['items']} item(s), {megabytes:.1f} MB in {wall:.1f}s "
+          f"({megabytes / wall:.2f} MB/s, {stats['items'] * 60 / wall:.1f} items/min, busy {stats['busy']:.1f}s)")
+
+def run_batch(list_path, destination_folder, download_thumbnail, lowPerformance, download_workers=3, encode_workers=1, range_fetch=True, sharpen=False, chunked=None, cache=None):
+    """Download and encode every job in a URL list file with run_jobs.
+
+    Returns the list of (job, error) failures.
+    """
+    jobs = parse_batch_file(list_path)
+    print(f"Queued {len(jobs)} job(s) from {list_path}")
+    return run_jobs(jobs, destination_folder, download_thumbnail, lowPerformance, download_workers,
+                    encode_workers, range_fetch, sharpen, chunked, cache)
+
+def run_jobs(jobs, destination_folder, download_thumbnail, lowPerformance, download_workers=3, encode_workers=1, range_fetch=True, sharpen=False, chunked=None, cache=None, on_finished=None):
+    """Download and encode jobs as a two-stage pipeline with separate worker pools.
+
+    on_finished is called with each finished job and its source. Returns the (job, error) failures.
+    """
+    lock = threading.Lock()
+    stats = {'download': new_stage_stats(), 'encode': new_stage_stats()}
+    failures = []
+
+    def encode_job(job, source):
+        resolution = job['resolution']
+        started = time.monotonic()
+        mode = finish_source(source, resolution == '8k', resolution == '4k', resolution == '2k', lowPerformance, sharpen, chunked)
+        output_paths = get_output_paths(source)
+        record_stage(stats['encode'], lock, started, sum(os.path.getsize(path) for path in output_paths))
+        print(f"[{'copied' if mode == 'copy' else 'encoded'}] {job['url']} -> {', '.join(output_paths)}")
+        if on_finished:
+            on_finished(job, source)
+
+    def download_job(job):
+        started = time.monotonic()
+        resolution = job['resolution']
+        target_height = get_target_height(resolution == '8k', resolution == '4k', resolution == '2k', lowPerformance)
+        source = fetch_source(job['url'], destination_folder, download_thumbnail, job['time_range'],
+                              range_fetch, quiet=True, cache=cache, target_height=target_height)
+        record_stage(stats['download'], lock, started, sum(os.path.getsize(path) for path in source['paths']))
+        print(f"[downloaded] {job['url']}")
+        return encode_pool.submit(encode_job, job, source)
+
+    for job in jobs:
+        if job.get('error'):
+            print(f"[failed] {job['label']} {job['url']}: {job['error']}")
+            failures.append((job, job['error']))
+
+    with ThreadPoolExecutor(max_workers=encode_workers) as encode_pool:
+        with ThreadPoolExecutor(max_workers=download_workers) as download_pool:
+            download_futures = {download_pool.submit(download_job, job): job for job in jobs if not job.get('error')}
+            encode_futures = {}
+            for future in as_completed(download_futures):
+                job = download_futures[future]
+                try:
+                    encode_futures[future.result()] = job
+                except Exception as e:
+                    print(f"[failed] {job['label']} {job['url']}: download error: {e}")
+                    failures.append((job, e))
+        for future in as_completed(encode_futures):
+            job = encode_futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[failed] {job['label']} {job['url']}: encode error: {e}")
+                failures.append((job, e))
+
+    print_stage_stats("Download", stats['download'])
+    print_stage_stats("Encode", stats['encode'])
+    print(f"{len(jobs) - len(failures)} of {len(jobs)} job(s) completed.")
+    return failures
+
+SYNC_INDEX_NAME = '.sync_index.sqlite'
+
+def open_sync_index(destination_folder):
+    """Open (creating if needed) the SQLite index of the videos already synced into a folder."""
+    import sqlite3
+    os.makedirs(destination_folder, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(destination_folder, SYNC_INDEX_NAME), check_same_thread=False)
+    connection.execute('''CREATE TABLE IF NOT EXISTS videos (
+        extractor TEXT NOT NULL,
+        video_id TEXT NOT NULL,
+        output_path TEXT NOT NULL,
+        profile TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        checksum TEXT NOT NULL,
+        synced REAL NOT NULL,
+        PRIMARY KEY (extractor, video_id))''')
+    connection.commit()
+    return connection
+
+def get_sync_profile(resolution, lowPerformance, sharpen):
+    """Describe the settings an output was made with, so a change re-processes the video."""
+    return f"{resolution or 'source'}/{'low' if lowPerformance else 'high'}{'/sharpen' if sharpen else ''}"
+
+def list_playlist_entries(ydl, url, seen=None):
+    """List the videos of a playlist or channel with flat extraction, following channel tabs.
+
+    Only the playlist pages are fetched, not the individual videos. Returns dicts with the
+    'extractor', 'id' and 'url' of every video, without duplicates.
+    """
+    seen = set() if seen is None else seen
+    info = ydl.extract_info(url, download=False)
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        info = {'entries': [dict(info, ie_key=info.get('extractor_key'), url=info.get('webpage_url') or url)]}
+    entries = []
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('_type') == 'playlist' or entry.get('ie_key') == 'YoutubeTab':
+            entries += list_playlist_entries(ydl, entry.get('url') or entry.get('webpage_url'), seen)
+            continue
+        key = (entry.get('ie_key') or entry.get('extractor_key') or '', entry.get('id'))
+        if key[1] is None or key in seen:
+            continue
+        seen.add(key)
+        entries.append({'extractor': key[0], 'id': key[1], 'url': entry.get('url') or entry.get('webpage_url')})
+    return entries
+
+def run_sync(url, destination_folder, download_thumbnail, lowPerformance, resolution='', download_workers=3, encode_workers=1, sharpen=False, chunked=None, cache=None, verify=False):
+    """Mirror a playlist or channel into destination_folder, processing only new or changed videos.
+
+    Returns the list of (job, error) failures.
+    """
+    load_yt_dlp()
+    connection = open_sync_index(destination_folder)
+    lock = threading.Lock()
+    profile = get_sync_profile(resolution, lowPerformance, sharpen)
+    try:
+        started = time.monotonic()
+        with yt_dlp.YoutubeDL({'extract_flat': 'in_playlist', 'quiet': True, 'noprogress': True}) as ydl:
+            entries = list_playlist_entries(ydl, url)
+        indexed = {(row[0], row[1]): row[2:] for row in connection.execute(
+            'SELECT extractor, video_id, output_path, profile, size, checksum FROM videos')}
+
+        jobs = []
+        for position, entry in enumerate(entries, 1):
+            record = indexed.get((entry['extractor'], entry['id']))
+            if record:
+                output_path, record_profile, size, checksum = record
+                if (record_profile == profile and os.path.exists(output_path) and os.path.getsize(output_path) == size
+                        and (not verify or file_sha256(output_path) == checksum)):
+                    continue
+            jobs.append({'url': entry['url'], 'time_range': None, 'resolution': resolution,
+                         'label': f"entry {position}", 'extractor': entry['extractor'], 'id': entry['id']})
+        print(f"Listed {len(entries)} video(s) in {time.monotonic() - started:.1f}s, "
+              f"{len(entries) - len(jobs)} already synced, {len(jobs)} to process")
+        if not jobs:
+            return []
+
+        def record_job(job, source):
+            output_path = source['output_path']
+            row = (job['extractor'], job['id'], output_path, profile, os.path.getsize(output_path),
+                   file_sha256(output_path), time.time())
+            with lock:
+                connection.execute('INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+                connection.commit()
+
+        return run_jobs(jobs, destination_folder, download_thumbnail, lowPerformance, download_workers,
+                        encode_workers, sharpen=sharpen, chunked=chunked, cache=cache, on_finished=record_job)
+    finally:
+        connection.close()
+
+DEFAULT_SERVICE_PORT = 8765
+
+def open_job_queue(queue_path=None):
+    """Open (creating if needed) the SQLite job queue of the service mode.
+
+    A job moves through queued, downloading, downloaded, encoding and done (or failed).
+    The fetched source is stored with the job once it is downloaded, so an interrupted
+    job can pick up again at the encode; while downloading it only names the work folder.
+    """
+    import sqlite3
+    queue_path = queue_path or os.path.join(get_cache_dir(), 'jobs.sqlite')
+    connection = sqlite3.connect(queue_path, check_same_thread=False)
+    connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL,
+        source TEXT,
+        outputs TEXT,
+        error TEXT,
+        created REAL NOT NULL,
+        updated REAL NOT NULL)''')
+    connection.commit()
+    return connection
+
+def get_job_destination(destination_folder, destination):
+    """Resolve a job's destination inside the service's destination folder.
+
+    destination is a folder relative to destination_folder; anything that resolves
+    outside of it raises ValueError.
+    """
+    root = os.path.realpath(destination_folder)
+    path = os.path.realpath(os.path.join(root, destination or ''))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError("'destination' must be a folder inside the service's destination folder")
+    return path
+
+def parse_job_params(body, destination_folder):
+    """Validate a submitted job and fill in the defaults; raises ValueError for bad input.
+
+    The fields match download_video: 'url', 'time_range' (as typed at the prompt, several
+    ranges separated by commas), 'thumbnail', 'resolution' (8k/4k/2k), 'low_performance',
+    'sharpen' and an optional 'destination' folder relative to destination_folder.
+    """
+    if not isinstance(body, dict) or not isinstance(body.get('url'), str) or not body['url']:
+        raise ValueError("'url' is required")
+    for field in ('time_range', 'resolution', 'destination'):
+        if not isinstance(body.get(field, ''), (str, type(None))):
+            raise ValueError(f"'{field}' must be a string")
+    for field in ('thumbnail', 'low_performance', 'sharpen'):
+        if not isinstance(body.get(field, False), bool):
+            raise ValueError(f"'{field}' must be true or false")
+    resolution = (body.get('resolution') or '').lower()
+    if resolution not in ('', '8k', '4k', '2k'):
+        raise ValueError("'resolution' must be 8k, 4k or 2k")
+    return {
+        'url': body['url'],
+        'time_range': parse_time_ranges(body['time_range']) if body.get('time_range') else None,
+        'thumbnail': body.get('thumbnail', False),
+        'resolution': resolution,
+        'low_performance': body.get('low_performance', False),
+        'sharpen': body.get('sharpen', False),
+        'destination': get_job_destination(destination_folder, body.get('destination')),
+    }
+
+def run_service(destination_folder, port=DEFAULT_SERVICE_PORT, queue_path=None, download_workers=3, encode_workers=1, range_fetch=True, chunked=None, cache=None):
+    """Run a local HTTP/JSON job service backed by a durable queue (see open_job_queue).
+
+    Interrupted jobs resume from their last finished stage on start.
+    """
+    import http.server
+    connection = open_job_queue(queue_path)
+    lock = threading.Lock()
+    download_pool = ThreadPoolExecutor(max_workers=download_workers)
+    encode_pool = ThreadPoolExecutor(max_workers=encode_workers)
+    submitted = set()
+    wake = threading.Event()
+
+    def query(sql, parameters=()):
+        with lock:
+            rows = connection.execute(sql, parameters).fetchall()
+            connection.commit()
+            return rows
+
+    def set_status(job_id, status, **columns):
+        assignments = ''.join(f', {column} = ?' for column in columns)
+        query(f'UPDATE jobs SET status = ?, updated = ?{assignments} WHERE id = ?',
+              (status, time.time(), *columns.values(), job_id))
+
+    def load_job(job_id):
+        job_id, params, status, source, outputs, error, created, updated = query('SELECT * FROM jobs WHERE id = ?', (job_id,))[0]
+        return {'id': job_id, 'params': json.loads(params), 'status': status,
+                'source': json.loads(source) if source else None, 'outputs': json.loads(outputs) if outputs else None,
+                'error': error, 'created': created, 'updated': updated}
+
+    def encode_job(job_id):
+        job = load_job(job_id)
+        params = job['params']
+        set_status(job_id, 'encoding')
+        try:
+            resolution = params['resolution']
+            finish_source(job['source'], resolution == '8k', resolution == '4k', resolution == '2k',
+                          params['low_performance'], params['sharpen'], chunked)
+        except Exception as e:
+            set_status(job_id, 'failed', error=f"encode error: {e}")
+            print(f"[failed] job {job_id} {params['url']}: encode error: {e}")
+            return
+        outputs = get_output_paths(job['source'])
+        set_status(job_id, 'done', outputs=json.dumps(outputs))
+        print(f"[done] job {job_id} {params['url']} -> {', '.join(outputs)}")
+
+    def download_job(job_id):
+        params = load_job(job_id)['params']
+        # Stored right away so a restart after a crash mid-download can delete what was fetched
+        work_folder = os.path.join(get_work_folder(params['destination']), f'job-{job_id}')
+        set_status(job_id, 'downloading', source=json.dumps({'paths': [], 'cleanup_folder': work_folder}))
+        resolution = params['resolution']
+        try:
+            source = fetch_source(params['url'], params['destination'], params['thumbnail'], params['time_range'],
+                                  range_fetch, quiet=True, cache=cache,
+                                  target_height=get_target_height(resolution == '8k', resolution == '4k',
+                                                                  resolution == '2k', params['low_performance']),
+                                  work_folder=work_folder)
+        except Exception as e:
+            set_status(job_id, 'failed', error=f"download error: {e}")
+            print(f"[failed] job {job_id} {params['url']}: download error: {e}")
+            return
+        set_status(job_id, 'downloaded', source=json.dumps(source))
+        print(f"[downloaded] job {job_id} {params['url']}")
+        encode_pool.submit(encode_job, job_id)
+
+    # Resume whatever the last run left unfinished
+    for job_id, status, source in query("SELECT id, status, source FROM jobs WHERE status IN ('downloading', 'downloaded', 'encoding')"):
+        source = json.loads(source) if source else None
+        if status != 'downloading' and source and reclaim_source(source):
+            print(f"Resuming job {job_id} at the encode")
+            query('UPDATE jobs SET source = ? WHERE id = ?', (json.dumps(source), job_id))
+            submitted.add(job_id)
+            encode_pool.submit(encode_job, job_id)
         else:
-            ydl_opts['postprocessor_args'] = [
-                '-c:v', 'hevc_nvenc',   # Use NVIDIA NVENC encoder
-                '-preset', 'p5',        # NVENC presets from p1 (fastest, lower quality) to p7 (slowest, better quality), set to p5 or p4 for good quality and speed
-                '-cq', '22',            # Set constant quality level (lower is better quality, set to around 18-24 and 0 is lowest)
-                '-c:a', 'flac',         # Use FLAC audio codec for lossless audio, AAC for faster encoding
-                '-profile:v', 'main',   # Set H.264 profile to main for compatibility with most devices
-                '-vf', 'unsharp=5:5:0.8:3:3:0.4',  # sharpen for better quality
-            ]
-    
+            print(f"Restarting the download of job {job_id}")
+            if source:
+                remove_source(source)
+            set_status(job_id, 'queued')
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+    def dispatch():
+        while True:
+            for (job_id,) in query("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id"):
+                if job_id not in submitted:
+                    submitted.add(job_id)
+                    download_pool.submit(download_job, job_id)
+            wake.wait(5)
+            wake.clear()
+
+    class JobHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parts = self.path.strip('/').split('/')
+            if parts == ['jobs']:
+                rows = query('SELECT id FROM jobs ORDER BY id')
+                self.send_json(200, [load_job(job_id) for (job_id,) in rows])
+            elif len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit() and query('SELECT 1 FROM jobs WHERE id = ?', (int(parts[1]),)):
+                self.send_json(200, load_job(int(parts[1])))
+            else:
+                self.send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path.strip('/') != 'jobs':
+                self.send_json(404, {'error': 'not found'})
+                return
+            if self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+                self.send_json(415, {'error': 'the body must be application/json'})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'null')
+                params = parse_job_params(body, destination_folder)
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            now = time.time()
+            with lock:
+                cursor = connection.execute('INSERT INTO jobs (params, status, created, updated) VALUES (?, ?, ?, ?)',
+                                            (json.dumps(params), 'queued', now, now))
+                connection.commit()
+            wake.set()
+            self.send_json(201, load_job(cursor.lastrowid))
+
+    threading.Thread(target=dispatch, daemon=True).start()
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), JobHandler)
+    print(f"Accepting jobs on http://127.0.0.1:{port}/jobs")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping. Unfinished jobs resume on the next start.")
+        server.server_close()
+        os._exit(0)  # Don't wait for running jobs, their state is already on disk
+
+# Synthetic sources for benchmark_encode as (width, height, seconds), all at 30 fps
+BENCHMARK_SOURCES = [(640, 360, 10), (1280, 720, 10), (1920, 1080, 5)]
+BENCHMARK_FPS = 30
+
+# Encode settings benchmark_encode runs every source through; all of them re-encode. The
+# planner skips scaling a source that already has the target height, so 'high-2k' only
+# scales the smaller sources and 'high-4k' covers scaling for the 1080p one
+BENCHMARK_PROFILES = {
+    'high': {'force4K': False, 'force2K': False, 'lowPerformance': False},
+    'high-2k': {'force4K': False, 'force2K': True, 'lowPerformance': False},
+    'high-4k': {'force4K': True, 'force2K': False, 'lowPerformance': False},
+    'lowPerformance': {'force4K': False, 'force2K': False, 'lowPerformance': True},
+}
+
+# A profile counts as a regression when it gets this much slower than the baseline
+BENCHMARK_REGRESSION_RATIO = 1.10
+
+def make_benchmark_source(path, width, height, seconds):
+    """Generate a test video with ffmpeg's testsrc2 pattern and a sine tone."""
+    video_codec = 'libx264' if 'libx264' in probe_encoders() else 'mpeg4'
+    subprocess.run(['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+                    '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={BENCHMARK_FPS}:duration={seconds}',
+                    '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={seconds}',
+                    '-c:v', video_codec, '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-movflags', '+faststart', path], check=True)
+
+@contextlib.contextmanager
+def serve_folder(folder):
+    """Serve a folder over HTTP on a free localhost port, yielding the base URL."""
+    import http.server
+
+    class QuietHandler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=folder))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}/'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def measure_quality(reference_path, output_path):
+    """Score an output against its reference with VMAF and SSIM, as far as this ffmpeg supports them.
+
+    The output is scaled back to the reference size first, so scaled profiles can be scored too.
+    """
+    result = subprocess.run(['ffmpeg', '-hide_banner', '-filters'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    available = {line.split()[1] for line in result.stdout.splitlines() if len(line.split()) > 1}
+    reference = probe_video_stream([reference_path])
+    scores = {}
+    for name, key, pattern in (('libvmaf', 'vmaf', r'VMAF score[:=]\s*([\d.]+)'), ('ssim', 'ssim', r'All:([\d.]+)')):
+        if name not in available:
+            continue
+        graph = (f"[0:v]scale={reference['width']}:{reference['height']}:flags=bicubic,format=yuv420p[distorted];"
+                 f"[1:v]format=yuv420p[reference];[distorted][reference]{name}")
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-i', output_path, '-i', reference_path,
+                                 '-lavfi', graph, '-f', 'null', '-'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        match = re.search(pattern, result.stderr)
+        if result.returncode == 0 and match:
+            scores[key] = round(float(match.group(1)), 4)
+    return scores
+
+def compare_benchmark(results, baseline):
+    """Print how each result differs from the matching baseline entry and return the number of regressions."""
+    previous = {(entry['source'], entry['profile'], entry['encoder']): entry for entry in baseline.get('results', [])}
+    regressions = 0
+    for entry in results:
+        old = previous.get((entry['source'], entry['profile'], entry['encoder']))
+        if not old:
+            print(f"{entry['source']} {entry['profile']} {entry['encoder']}: not in the baseline")
+            continue
+        ratio = entry['encode_seconds'] / max(old['encode_seconds'], 1e-6)
+        regressed = ratio > BENCHMARK_REGRESSION_RATIO
+        regressions += regressed
+        print(f"{entry['source']} {entry['profile']} {entry['encoder']}: encode {ratio - 1:+.1%}, "
+              f"size {entry['output_bytes'] / max(old['output_bytes'], 1) - 1:+.1%}"
+              f"{' REGRESSION' if regressed else ''}")
+    return regressions
+
+def benchmark_encode(output_path=None, baseline_path=None, sources=BENCHMARK_SOURCES, profiles=BENCHMARK_PROFILES, encoders=None):
+    """Run every encode profile end to end on local synthetic sources and compare with a baseline.
+
+    Returns the results and the number of regressions.
+    """
+    import platform
+    encoders = encoders or [encoder for encoder in probe_encoders() if encoder in SOFTWARE_ENCODERS]
+    if not encoders:
+        raise RuntimeError("No usable CPU video encoder found.")
+    work_folder = tempfile.mkdtemp(prefix='encode-bench-')
+    source_folder = os.path.join(work_folder, 'sources')
+    destination_folder = os.path.join(work_folder, 'output')
+    os.makedirs(source_folder)
+    os.makedirs(destination_folder)
+    results = []
+    try:
+        with serve_folder(source_folder) as base_url:
+            for width, height, seconds in sources:
+                name = f'{width}x{height}-{seconds}s'
+                reference_path = os.path.join(source_folder, f'bench-{name}.mp4')
+                make_benchmark_source(reference_path, width, height, seconds)
+                for encoder in encoders:
+                    for profile, settings in profiles.items():
+                        started = time.perf_counter()
+                        source = fetch_source(f'{base_url}bench-{name}.mp4', destination_folder, False, quiet=True)
+                        encode_started = time.perf_counter()
+                        finish_source(source, False, settings['force4K'], settings['force2K'], settings['lowPerformance'],
+                                      sharpen=True, encoder=encoder)
+                        finished = time.perf_counter()
+                        entry = {
+                            'source': name, 'profile': profile, 'encoder': encoder,
+                            'wall_seconds': round(finished - started, 3),
+                            'encode_seconds': round(finished - encode_started, 3),
+                            'fps': round(seconds * BENCHMARK_FPS / (finished - encode_started), 2),
+                            'output_bytes': os.path.getsize(source['output_path']),
+                        }
+                        entry.update(measure_quality(reference_path, source['output_path']))
+                        os.remove(source['output_path'])
+                        print(json.dumps(entry))
+                        results.append(entry)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    version = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True).stdout
+    report = {'created': time.time(), 'machine': platform.platform(), 'cpu_count': os.cpu_count(),
+              'ffmpeg': version.splitlines()[0] if version else None, 'results': results}
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2)
+    regressions = 0
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as baseline_file:
+            regressions = compare_benchmark(results, json.load(baseline_file))
+        print(f"{regressions} regression(s) against {baseline_path}")
+    return results, regressions
+
+def benchmark_startup(runs=5):
+    """Measure interpreter start, module import and time to the first prompt, in milliseconds.
+
+    Prints one JSON line with the medians so the numbers can be tracked between versions.
+    """
+    script_path = os.path.abspath(__file__)
+    import_code = ('import importlib.util, sys; '
+                   'spec = importlib.util.spec_from_file_location("installer", sys.argv[1]); '
+                   'spec.loader.exec_module(importlib.util.module_from_spec(spec))')
+
+    def time_command(command):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        return (time.perf_counter() - started) * 1000
+
+    def time_first_prompt():
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, script_path], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        timer = threading.Timer(30, process.kill)
+        timer.start()
+        output = b''
+        try:
+            while b'Enter the YouTube video URL' not in output:
+                block = process.stdout.read1(4096)
+                if not block:
+                    return None
+                output += block
+            return (time.perf_counter() - started) * 1000
+        finally:
+            timer.cancel()
+            process.kill()
+            process.wait()
+
+    results = {
+        'interpreter_ms': [time_command([sys.executable, '-c', 'pass']) for _ in range(runs)],
+        'import_ms': [time_command([sys.executable, '-c', import_code, script_path]) for _ in range(runs)],
+        'first_prompt_ms': [time_first_prompt() for _ in range(runs)],
+    }
+    summary = {}
+    for name, values in results.items():
+        values = sorted(value for value in values if value is not None)
+        summary[name] = round(values[len(values) // 2], 1) if values else None
+    print(json.dumps(summary))
+    return summary
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Download YouTube videos, optionally trimmed and re-encoded to a higher resolution.")
+    parser.add_argument('--batch', metavar='URL_LIST', help="file with one URL per line, optionally followed by a time range and 8K/4K/2K")
+    parser.add_argument('--sync', metavar='PLAYLIST_URL', help="mirror a playlist or channel, processing only videos not synced before")
+    parser.add_argument('--resolution', choices=['8k', '4k', '2k'], type=str.lower, default='', help="resolution to force in sync mode")
+    parser.add_argument('--verify', action='store_true', help="in sync mode, also compare the checksums of already synced files")
+    parser.add_argument('--serve', nargs='?', type=int, const=DEFAULT_SERVICE_PORT, metavar='PORT', help=f"run as a local job service on PORT (default: {DEFAULT_SERVICE_PORT}); jobs write below --destination")
+    parser.add_argument('--queue', metavar='FILE', help="job queue database for --serve (default: ~/.youtube_video_installer/jobs.sqlite)")
+    parser.add_argument('--destination', help="destination folder (asked interactively when omitted)")
+    parser.add_argument('--thumbnail', action='store_true', help="also download thumbnails in batch and sync mode")
+    parser.add_argument('--low-performance', action='store_true', help="use the faster, lower quality encode settings in batch and sync mode")
+    parser.add_argument('--sharpen', action='store_true', help="re-encode with sharpening even when no resolution is forced in batch and sync mode")
+    parser.add_argument('--full-download', action='store_true', help="download the whole video even when only a time range is needed")
+    parser.add_argument('--download-workers', type=int, default=3, help="parallel downloads in batch, sync and service mode (default: 3)")
+    parser.add_argument('--encode-workers', type=int, default=1, help="parallel ffmpeg encodes in batch, sync and service mode (default: 1)")
+    parser.add_argument('--chunked', action='store_true', help="split software encodes into segments that are encoded in parallel")
+    parser.add_argument('--chunk-workers', type=int, default=max(1, (os.cpu_count() or 1) // 4), help="parallel segment encodes for --chunked")
+    parser.add_argument('--segment-length', type=float, default=DEFAULT_SEGMENT_LENGTH, help=f"minimum segment length in seconds for --chunked (default: {DEFAULT_SEGMENT_LENGTH})")
+    parser.add_argument('--cache', action='store_true', help="keep downloaded source streams in a local cache and reuse them in later runs")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_CACHE_SIZE / 1000 ** 3, help="stream cache budget in GB (default: %(default)s)")
+    parser.add_argument('--cache-dir', help="stream cache folder (default: ~/.youtube_video_installer/streams)")
+    parser.add_argument('--stream', action='store_true', help="encode while the video is still downloading (whole-video re-encodes only)")
+    parser.add_argument('--metrics', metavar='FILE', help="append per-stage timings and progress as JSON lines to FILE ('-' for stdout, other output then goes to stderr)")
+    parser.add_argument('--prometheus-textfile', metavar='FILE', help="keep per-stage totals in FILE in the Prometheus textfile format")
+    parser.add_argument('--benchmark-install', action='store_true', help="compare the ffmpeg install paths on a generated zip and exit")
+    parser.add_argument('--benchmark-startup', action='store_true', help="measure import and startup time and exit")
+    parser.add_argument('--benchmark-encode', action='store_true', help="run the encode profiles end to end on generated videos and exit")
+    parser.add_argument('--benchmark-output', metavar='FILE', help="write the --benchmark-encode results to FILE as a JSON baseline")
+    parser.add_argument('--benchmark-baseline', metavar='FILE', help="compare the --benchmark-encode results with an earlier baseline")
+    args = parser.parse_args()
+
+    if args.benchmark_install:
+        benchmark_ffmpeg_install()
+        sys.exit()
+    if args.benchmark_startup:
+        benchmark_startup()
+        sys.exit()
+    if args.benchmark_encode:
+        _, regressions = benchmark_encode(args.benchmark_output, args.benchmark_baseline)
+        sys.exit(1 if regressions else 0)
+    chunked = {'workers': args.chunk_workers, 'segment_length': args.segment_length} if args.chunked else None
+    configure_metrics(args.metrics, args.prometheus_textfile)
+
     check_ffmpeg()
     check_python()
 
+    # Import yt_dlp in the background while the questions are being answered
+    threading.Thread(target=preload_yt_dlp, daemon=True).start()
+
     try:
-        import yt_dlp
-    except ImportError:
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'yt-dlp'])
-        import yt_dlp
+        print(f"Using the {select_encoder()} video encoder.")
+    except RuntimeError as e:
+        print(f"Warning: {e}. Only downloads that need no re-encode will work.")
+
+    cache = get_stream_cache(int(args.cache_size * 1000 ** 3), args.cache_dir) if args.cache else None
+
+    if args.batch:
+        destination_folder = args.destination or input("Enter the destination folder: ")
+        try:
+            failures = run_batch(args.batch, destination_folder, args.thumbnail, args.low_performance,
+                                 args.download_workers, args.encode_workers, not args.full_download, args.sharpen, chunked, cache)
+        except OSError as e:
+            print(f"Error reading the URL list: {e}")
+            sys.exit(1)
+        sys.exit(1 if failures else 0)
+
+    if args.serve:
+        destination_folder = args.destination or input("Enter the destination folder: ")
+        run_service(destination_folder, args.serve, args.queue, args.download_workers, args.encode_workers,
+                    not args.full_download, chunked, cache)
+        sys.exit()
+
+    if args.sync:
+        destination_folder = args.destination or input("Enter the destination folder: ")
+        failures = run_sync(args.sync, destination_folder, args.thumbnail, args.low_performance, args.resolution,
+                            args.download_workers, args.encode_workers, args.sharpen, chunked, cache, args.verify)
+        sys.exit(1 if failures else 0)
 
     url = input("Enter the YouTube video URL: ")
     destination_folder = input("Enter the destination folder: ")
@@ -434,21 +2466,23 @@ if __name__ == '__main__':
     if not os.path.exists(destination_folder):
         print("Destination folder does not exist.")
 
-    time_input = input("Enter the time range to download (e.g., '6:01-6:50' or '20:47-23:03'), or press Enter to download the whole video: ")
+    time_input = input("Enter the time range to download (e.g., '6:01-6:50' or '20:47-23:03', separate several with commas to cut multiple clips), or press Enter to download the whole video: ")
     thumbnail = input("Would you like to download the thumbnail? (y/n): ")
 
     low_performance = input("If you have a weak computer I highly recommend saying \"y\" to this. (y/n): ")
 
+    forceResolution = ''
     if low_performance.lower() != 'y':
         forceResolution = input("Would you like to force the video to be in a high resolution? (8K/4K/2K or press enter to not change it from the original): ")
+
+    sharpen = False
+    if forceResolution.lower() not in ('8k', '4k', '2k'):
+        sharpen = input("Would you like to sharpen the video? This re-encodes it, otherwise the original streams are copied without any quality loss. (y/n): ").lower() == 'y'
     
     time_range = None
     if time_input:
         try:
-            start_time_str, end_time_str = time_input.split('-')
-            start_time = parse_time(start_time_str)
-            end_time = parse_time(end_time_str)
-            time_range = f'*{start_time}-{end_time}'
+            time_range = parse_time_ranges(time_input)
         except Exception as e:
             print(f"Error parsing time range: {e}")
             exit(1)
@@ -485,4 +2519,4 @@ if __name__ == '__main__':
     if low_performance.lower() == 'y':
        lowPerformance = True
     
-    download_video(url, destination_folder, time_range, download_thumbnail, eightK, fourK, twoK, lowPerformance)
\ No newline at end of file
+    download_video(url, destination_folder, time_range, download_thumbnail, eightK, fourK, twoK, lowPerformance, not args.full_download, sharpen, chunked, cache, args.stream)
\ No newline at end of file
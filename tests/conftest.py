@@ -0,0 +1,103 @@
+"""Shared fixtures: the installer script loaded as a module and a local HTTP server with Range support."""
+import contextlib
+import functools
+import http.server
+import importlib.util
+import os
+import re
+import socket
+import threading
+
+import pytest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Youtube Video Installer.py')
+
+
+@pytest.fixture(scope='session')
+def installer():
+    spec = importlib.util.spec_from_file_location('youtube_video_installer', SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class RangeHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve files with single 'bytes=start-end' Range requests and count the bytes sent.
+
+    The Range headers received are kept in the server's 'ranges'. With the server's
+    accept_ranges turned off they are ignored and files are sent whole.
+    """
+
+    def setup(self):
+        # A small send buffer keeps the count close to what the client actually reads before
+        # hanging up, instead of whatever fits in the loopback socket buffers
+        self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 64 * 1024)
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        self.remaining = None
+        if match:
+            self.server.ranges.append(match.group(0))
+        if not self.server.accept_ranges or not match or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        if match.group(1):
+            start, end = int(match.group(1)), int(match.group(2) or size - 1)
+        else:
+            start, end = size - int(match.group(2)), size - 1
+        end = min(end, size - 1)
+        if start >= size:
+            self.send_error(416)
+            return None
+        media_file = open(path, 'rb')
+        media_file.seek(start)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self.remaining = end - start + 1
+        return media_file
+
+    def copyfile(self, source, outputfile):
+        remaining = self.remaining
+        while remaining is None or remaining > 0:
+            chunk = source.read(16 * 1024 if remaining is None else min(16 * 1024, remaining))
+            if not chunk:
+                break
+            try:
+                outputfile.write(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                break  # the client hangs up once it has read what it needs
+            self.server.bytes_sent += len(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+
+@contextlib.contextmanager
+def serve_folder(folder, accept_ranges=True):
+    """Serve folder over HTTP; yields the server, whose 'url' is the base URL to fetch files from."""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(RangeHandler, directory=str(folder)))
+    server.bytes_sent = 0
+    server.ranges = []
+    server.accept_ranges = accept_ranges
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def range_server():
+    """Return serve_folder, for tests that serve fixture files over HTTP with Range support."""
+    return serve_folder
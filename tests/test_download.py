@@ -0,0 +1,83 @@
+"""Parallel ranged downloads and checksum lookups against a local HTTP server."""
+import hashlib
+import json
+import os
+import ssl
+
+import pytest
+
+FILE_SIZE = 256 * 1024
+
+
+@pytest.fixture
+def served_folder(tmp_path, installer, monkeypatch):
+    # Small enough that the test file is split across connections
+    monkeypatch.setattr(installer, 'MIN_SPLIT_SIZE', 1024)
+    folder = tmp_path / 'served'
+    folder.mkdir()
+    (folder / 'ffmpeg.zip').write_bytes(os.urandom(FILE_SIZE))
+    return folder
+
+
+def test_ranged_download_uses_every_connection(installer, range_server, served_folder, tmp_path):
+    output_path = str(tmp_path / 'ffmpeg.zip')
+    with range_server(served_folder) as server:
+        installer.download_file(f'{server.url}/ffmpeg.zip', output_path, connections=4)
+
+    assert open(output_path, 'rb').read() == (served_folder / 'ffmpeg.zip').read_bytes()
+    assert not os.path.exists(output_path + '.state')
+    part_ranges = [byte_range for byte_range in server.ranges if byte_range != 'bytes=0-0']
+    assert len(part_ranges) == 4
+    assert server.bytes_sent == FILE_SIZE + 1  # the parts plus the probe's first byte
+
+
+def test_download_resumes_from_state(installer, range_server, served_folder, tmp_path):
+    data = (served_folder / 'ffmpeg.zip').read_bytes()
+    output_path = str(tmp_path / 'ffmpeg.zip')
+    half = FILE_SIZE // 2
+    with range_server(served_folder) as server:
+        url = f'{server.url}/ffmpeg.zip'
+        validator = installer.probe_download(url, ssl._create_unverified_context())[3]
+        # An earlier run got the first half of each of the two parts
+        parts = [[0, half - 1, half // 2], [half, FILE_SIZE - 1, half // 2]]
+        with open(output_path, 'wb') as out_file:
+            out_file.write(data[:half // 2] + bytes(half // 2) + data[half:half + half // 2] + bytes(half // 2))
+        with open(output_path + '.state', 'w', encoding='utf-8') as state_file:
+            json.dump({'url': url, 'size': FILE_SIZE, 'validator': validator, 'parts': parts}, state_file)
+        installer.download_file(url, output_path, connections=2)
+
+    assert open(output_path, 'rb').read() == data
+    assert not os.path.exists(output_path + '.state')
+    assert set(server.ranges[-2:]) == {f'bytes={half // 2}-{half - 1}', f'bytes={half + half // 2}-{FILE_SIZE - 1}'}
+    assert server.bytes_sent == FILE_SIZE // 2 + 2  # the missing halves plus both probes' first byte
+
+
+def test_checksum_mismatch_removes_the_download(installer, range_server, served_folder, tmp_path):
+    output_path = str(tmp_path / 'ffmpeg.zip')
+    with range_server(served_folder) as server:
+        with pytest.raises(IOError, match='Checksum mismatch'):
+            installer.download_file(f'{server.url}/ffmpeg.zip', output_path, sha256='0' * 64)
+        assert not os.path.exists(output_path)
+
+        sha256 = hashlib.sha256((served_folder / 'ffmpeg.zip').read_bytes()).hexdigest()
+        installer.download_file(f'{server.url}/ffmpeg.zip', output_path, sha256=sha256.upper())
+    assert installer.file_sha256(output_path) == sha256
+
+
+def test_download_without_range_support(installer, range_server, served_folder, tmp_path):
+    output_path = str(tmp_path / 'ffmpeg.zip')
+    with range_server(served_folder, accept_ranges=False) as server:
+        installer.download_file(f'{server.url}/ffmpeg.zip', output_path, connections=4)
+
+    assert open(output_path, 'rb').read() == (served_folder / 'ffmpeg.zip').read_bytes()
+    assert not os.path.exists(output_path + '.state')
+    assert server.ranges == ['bytes=0-0']  # only the probe asked for a range
+
+
+def test_get_ffmpeg_checksum(installer, range_server, served_folder):
+    sha256 = hashlib.sha256((served_folder / 'ffmpeg.zip').read_bytes()).hexdigest()
+    with range_server(served_folder) as server:
+        assert installer.get_ffmpeg_checksum(f'{server.url}/ffmpeg.zip') is None  # no checksums file yet
+        (served_folder / 'checksums.sha256').write_text(f'{"1" * 64}  other.zip\n{sha256} *ffmpeg.zip\n')
+        assert installer.get_ffmpeg_checksum(f'{server.url}/ffmpeg.zip') == sha256
+        assert installer.get_ffmpeg_checksum(f'{server.url}/missing.zip') is None
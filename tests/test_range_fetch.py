@@ -0,0 +1,74 @@
+"""Range fetch against a local DASH fixture served with HTTP Range support.
+
+Needs yt-dlp and ffmpeg; skipped when either is missing.
+"""
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('yt_dlp')
+if not shutil.which('ffmpeg'):
+    pytest.skip('ffmpeg is not installed', allow_module_level=True)
+
+FIXTURE_SECONDS = 300
+
+MPD_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{seconds}S"
+     profiles="urn:mpeg:dash:profile:isoff-on-demand:2011" minBufferTime="PT2S">
+  <Period>
+    <AdaptationSet mimeType="video/mp4">
+      <Representation id="video" codecs="avc1.64001f" width="640" height="360" frameRate="24" bandwidth="800000">
+        <BaseURL>video.mp4</BaseURL>
+      </Representation>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4">
+      <Representation id="audio" codecs="mp4a.40.2" audioSamplingRate="48000" bandwidth="128000">
+        <BaseURL>audio.m4a</BaseURL>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+
+
+@pytest.fixture(scope='module')
+def dash_folder(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('dash')
+    ffmpeg = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error']
+    subprocess.run(ffmpeg + ['-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate=24:duration={FIXTURE_SECONDS}',
+                             '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-g', '48', '-b:v', '800k',
+                             '-movflags', '+faststart', str(folder / 'video.mp4')], check=True)
+    subprocess.run(ffmpeg + ['-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={FIXTURE_SECONDS}',
+                             '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', str(folder / 'audio.m4a')],
+                   check=True)
+    (folder / 'manifest.mpd').write_text(MPD_TEMPLATE.format(seconds=FIXTURE_SECONDS), encoding='utf-8')
+    return folder
+
+
+def fetch(installer, range_server, dash_folder, destination, range_fetch):
+    with range_server(dash_folder) as server:
+        source = installer.fetch_source(f'{server.url}/manifest.mpd', str(destination), False, '0:20-0:25',
+                                        range_fetch=range_fetch, quiet=True)
+        return source, server.bytes_sent
+
+
+def test_range_fetch_downloads_less(installer, range_server, dash_folder, tmp_path):
+    full_source, full_bytes = fetch(installer, range_server, dash_folder, tmp_path / 'full', False)
+    ranged_source, ranged_bytes = fetch(installer, range_server, dash_folder, tmp_path / 'ranged', True)
+    print(f"Range fetch read {ranged_bytes} of {full_bytes} bytes (saved {full_bytes - ranged_bytes})")
+
+    fixture_bytes = os.path.getsize(dash_folder / 'video.mp4') + os.path.getsize(dash_folder / 'audio.m4a')
+    assert full_bytes >= fixture_bytes
+    assert ranged_bytes < full_bytes / 4
+    assert len(full_source['paths']) == 2
+    # The window's video and audio are cut together into one file so they share a timeline
+    assert len(ranged_source['paths']) == 1
+    assert os.path.getsize(ranged_source['paths'][0]) > 0
+    # The cut begins on the keyframe before the window (one every 2 seconds), so the trim moves
+    # later by as much to still start at 0:20 of the source
+    start, end = installer.get_range_seconds(ranged_source['time_range'])
+    offset = start - installer.RANGE_FETCH_MARGIN
+    assert 0 <= offset <= 2
+    assert end - start == pytest.approx(5)
@@ -0,0 +1,47 @@
+"""Sync mode with videos that share a title.
+
+Needs yt-dlp for the output file names; skipped when it is missing. The network side of
+fetching and the encode are replaced, so only the naming and the sync index are exercised.
+"""
+import os
+
+import pytest
+
+yt_dlp = pytest.importorskip('yt_dlp')
+
+# Two channel videos with the same title; their outputs have different sizes
+VIDEOS = {'aaaaaaaaaaa': b'a' * 100, 'bbbbbbbbbbb': b'b' * 200}
+
+
+def test_sync_is_idempotent_for_same_title_videos(installer, tmp_path, monkeypatch):
+    entries = [{'extractor': 'Youtube', 'id': video_id, 'url': f'https://www.youtube.com/watch?v={video_id}'}
+               for video_id in VIDEOS]
+    fetched = []
+
+    def fetch_source(url, destination_folder, download_thumbnail, time_range=None, range_fetch=True, quiet=False,
+                     cache=None, target_height=None):
+        video_id = url.rsplit('=', 1)[1]
+        fetched.append(video_id)
+        info = {'id': video_id, 'title': 'Live stream', 'ext': 'mp4'}
+        with yt_dlp.YoutubeDL({'restrictfilenames': True, 'quiet': True}) as ydl:
+            output_path = ydl.prepare_filename(
+                info, outtmpl=os.path.join(destination_folder, installer.get_output_name(time_range) + '.mp4'))
+        return installer.make_source(url, output_path, [([], time_range)], None)
+
+    def finish_source(source, *args):
+        with open(source['output_path'], 'wb') as output_file:
+            output_file.write(VIDEOS[source['url'].rsplit('=', 1)[1]])
+        return 'copy'
+
+    monkeypatch.setattr(installer, 'list_playlist_entries', lambda ydl, url: entries)
+    monkeypatch.setattr(installer, 'fetch_source', fetch_source)
+    monkeypatch.setattr(installer, 'finish_source', finish_source)
+
+    assert installer.run_sync('https://www.youtube.com/@channel', str(tmp_path), False, False) == []
+    assert sorted(fetched) == sorted(VIDEOS)
+    outputs = [name for name in os.listdir(tmp_path) if name.endswith('.mp4')]
+    assert len(outputs) == 2
+
+    fetched.clear()
+    assert installer.run_sync('https://www.youtube.com/@channel', str(tmp_path), False, False) == []
+    assert fetched == []